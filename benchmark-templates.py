@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+'''
+Benchmark the generation of CF-NetCDF templates with 10, 100 and 500 columns
+
+    ./benchmark-templates.py
+    ./benchmark-templates.py --columns 10 100 500 --end-row 1000 --repeat 5
+
+Reports the size of each workbook, the best generation time, the number of columns
+of the data sheet with cell restrictions, and the number of data validation rules
+they are written as, columns with the same restriction sharing one rule.
+'''
+
+import argparse
+import io
+import os
+import re
+import time
+import zipfile
+from xlsxwriter.utility import xl_cell_to_rowcol
+from website.lib.template_spec import parse_template_spec, resolve_template_spec
+from website.lib.config_snapshot import get_config_snapshot
+from website.lib.create_template import create_template, DEFAULT_END_ROW
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+def data_validation_counts(workbook):
+    '''
+    Number of data validation rules of the data sheet, which is the sheet after Variables and Global_Attributes,
+    and number of columns they cover
+    '''
+    with zipfile.ZipFile(io.BytesIO(workbook)) as zf:
+        sheet_xml = zf.read('xl/worksheets/sheet3.xml').decode('utf-8')
+    columns = 0
+    for sqref in re.findall(r'<dataValidation [^>]*sqref="([^"]*)"', sheet_xml):
+        for cell_range in sqref.split():
+            first, _, last = cell_range.partition(':')
+            columns += xl_cell_to_rowcol(last or first)[1] - xl_cell_to_rowcol(first)[1] + 1
+    return sheet_xml.count('<dataValidation '), columns
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the generation of CF-NetCDF templates')
+    parser.add_argument('--columns', type=int, nargs='+', default=[10, 100, 500], help='Numbers of columns (default 10 100 500)')
+    parser.add_argument('--end-row', type=int, default=DEFAULT_END_ROW, help=f'Final row of the cell restrictions (default {DEFAULT_END_ROW})')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per template, the best time is reported (default 3)')
+    parser.add_argument('--streaming', action='store_true', help='Generate the templates in streaming mode')
+    args = parser.parse_args()
+
+    cf_standard_names = get_config_snapshot(FIELDS_FILEPATH, 'CF-NetCDF').cf_standard_names
+
+    print(f"{'columns':>8} {'size (KB)':>10} {'time (s)':>9} {'restricted':>11} {'validations':>12}")
+    for columns in args.columns:
+        spec = parse_template_spec({
+            'config': 'CF-NetCDF',
+            'sheets': {'Data': [field['id'] for field in cf_standard_names[:columns]]},
+            'end_row': args.end_row
+        })
+        template_args = resolve_template_spec(spec, FIELDS_FILEPATH)
+        template_args['streaming'] = args.streaming
+
+        best = None
+        for _ in range(args.repeat):
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            create_template(buffer, **template_args)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        workbook = buffer.getvalue()
+
+        validations, restricted = data_validation_counts(workbook)
+        print(f"{columns:>8} {len(workbook) / 1024:>10.1f} {best:>9.3f} {restricted:>11} {validations:>12}")
+
+if __name__ == '__main__':
+    main()
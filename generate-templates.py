@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+'''
+Generate a batch of templates from a JSON file of template specifications, into one zip
+
+    ./generate-templates.py cruise_templates.json templates.zip --workers 8
+
+The JSON file holds a list of template specifications, or an object with the list
+under 'templates', as posted to /api/templates. See website/lib/template_spec.py
+'''
+
+import argparse
+import json
+import os
+import sys
+from website.lib.template_spec import parse_template_spec, resolve_template_spec, TemplateSpecError
+from website.lib.batch_templates import BatchPool, iter_batch_zip, unique_filenames, BATCH_MAX_WORKERS, BATCH_JOB_TIMEOUT
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a batch of templates into one zip')
+    parser.add_argument('specs', help='JSON file of template specifications')
+    parser.add_argument('output', help='Zip file to write')
+    parser.add_argument('--workers', type=int, default=BATCH_MAX_WORKERS, help=f'Number of worker processes (default {BATCH_MAX_WORKERS})')
+    parser.add_argument('--timeout', type=float, default=BATCH_JOB_TIMEOUT, help=f'Seconds each template can take (default {BATCH_JOB_TIMEOUT})')
+    args = parser.parse_args()
+
+    with open(args.specs) as f:
+        specs = json.load(f)
+    if isinstance(specs, dict):
+        specs = specs.get('templates', [])
+
+    jobs_args = []
+    filenames = []
+    for idx, spec in enumerate(specs):
+        try:
+            spec = parse_template_spec(spec)
+            jobs_args.append(resolve_template_spec(spec, FIELDS_FILEPATH))
+        except TemplateSpecError as e:
+            sys.exit(f'Template {idx}: {e}')
+        filenames.append(spec['filename'])
+
+    print(f"Generating {len(jobs_args)} templates")
+    pool = BatchPool(max_workers=min(args.workers, len(jobs_args)), fields_filepath=FIELDS_FILEPATH)
+    try:
+        with open(args.output, 'wb') as f:
+            for chunk in iter_batch_zip(list(zip(unique_filenames(filenames), jobs_args)), pool, timeout=args.timeout):
+                f.write(chunk)
+    finally:
+        pool.shutdown()
+    print("Written to", args.output)
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from flask import request, send_file, render_template, flash, redirect, url_for, session, request
+from flask import request, send_file, render_template, flash, redirect, url_for, session, request, make_response, jsonify, Response
+import io
 import os
 from website import create_app
 from website.lib.template import print_html_template
@@ -9,16 +10,53 @@ from website.lib.get_configurations import *
 from website.lib.create_template import create_template
 from website.lib.pull_cf_standard_names import cf_standard_names_update
 from website.lib.pull_global_attributes import global_attributes_update
-from website.lib.dropdown_lists_from_static_config_files import populate_dropdown_lists
-from website.lib.pull_darwin_core_terms import dwc_terms_update, get_dwc_extension_description
-from website.lib.usage_stats import log_template, log_visit
+from website.lib.config_snapshot import get_config_snapshot
+from website.lib.field_registry import get_field_registry
+from website.lib.config_model import get_config_model
+from website.lib.http_cache import page_etag, matching_etag, has_pending_flashes, with_page_etag, refresh_static_signature
+from website.lib.workbook_cache import workbook_key
+from website.lib.compression import encoded_etag
+from website.lib.term_picker import get_term_page, DEFAULT_PAGE_SIZE
+from website.lib.form_selection import FormSelection, resolve_selection
+from website.lib.template_spec import parse_template_spec, resolve_template_spec, TemplateSpecError
+from website.lib.pull_darwin_core_terms import dwc_terms_update
+from website.lib.catalogues import compile_catalogues
+from website.lib.batch_templates import iter_batch_zip, unique_filenames, BATCH_MAX_TEMPLATES
+from website.lib.usage_stats import log_template, log_templates, log_visit_in_background
 
 app = create_app()
+page_cache = app.extensions['page_cache']
+workbook_cache = app.extensions['workbook_cache']
+batch_pool = app.extensions['batch_pool']
 
 # Get the directory of the currently running script
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'visits.db')
 
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def send_workbook(template_args, filename):
+    '''
+    Send the workbook of a template, from the workbook cache if it was already generated.
+    The key of the workbook in the cache is its ETag.
+    '''
+    key = workbook_key(template_args)
+    if key is not None and request.if_none_match.contains(key):
+        return with_page_etag(make_response('', 304), key)
+
+    workbook = workbook_cache.get(key)
+    if workbook is None:
+        # Written in memory for this request, rather than to a file shared by all requests
+        buffer = io.BytesIO()
+        create_template(buffer, **template_args)
+        workbook = buffer.getvalue()
+        workbook_cache.set(key, workbook)
+
+    response = send_file(io.BytesIO(workbook), as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
+    if key is not None:
+        with_page_etag(response, key)
+    return response
+
 @app.route("/", methods=["GET", "POST"])
 def home_redirect():
     return redirect(url_for("home", config='CF-NetCDF'))
@@ -51,33 +89,42 @@ def home(config):
     BASE_PATH = os.path.dirname(os.path.abspath(__file__))
     FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
 
-    # Getting setup specific to this configuration
-    (
-        output_config_dict,
-        output_config_fields,
-        extra_fields_dict,
-        cf_standard_names,
-        groups,
-        dwc_terms
-    ) = get_config_fields(fields_filepath=FIELDS_FILEPATH, config=config, subconfig=subconfig)
-
-    sheets_descriptions = {}
-    for sheet in output_config_dict.keys():
-        for key in output_config_dict[sheet].keys():
-            if key not in ['Required CSV', 'Source']:
-                fields_dict = output_config_dict[sheet][key]
-                output_config_dict[sheet][key] = populate_dropdown_lists(fields_dict, config)
-
-        if config == 'Darwin Core':
-            sheets_descriptions[sheet] = get_dwc_extension_description(FIELDS_FILEPATH, sheet)
-        elif config == 'CF-NetCDF':
-            sheets_descriptions[sheet] = 'Template for data and metadata to be encoded in a CF-NetCDF file'
+    # The page only depends on the configuration and the versions of the catalogues and configurations,
+    # so a browser that already has it is answered before any catalogue work.
+    # Not when messages are waiting to be flashed, as they are part of the page.
+    etag = None
+    if request.method == "GET" and not has_pending_flashes(session):
+        etag = page_etag(config, subconfig, get_field_registry(FIELDS_FILEPATH).version, get_config_model().version)
+        cached_etag = matching_etag(request.if_none_match, etag)
+        if cached_etag is not None:
+            log_visit_in_background(ip_address, DB_PATH)
+            return with_page_etag(make_response('', 304), cached_etag)
+        # Pages are kept gzip compressed, so they are sent as they are to clients accepting gzip
+        if page_cache.compress and request.accept_encodings['gzip'] > 0:
+            page = page_cache.get(etag, gzipped=True)
+            if page is not None:
+                log_visit_in_background(ip_address, DB_PATH)
+                response = make_response(page)
+                response.headers['Content-Encoding'] = 'gzip'
+                response.vary.add('Accept-Encoding')
+                return with_page_etag(response, encoded_etag(etag, 'gzip'))
         else:
-            sheets_descriptions[sheet] = None
+            html = page_cache.get(etag)
+            if html is not None:
+                log_visit_in_background(ip_address, DB_PATH)
+                return with_page_etag(make_response(html), etag)
 
-    extra_fields_dict = populate_dropdown_lists(extra_fields_dict, config)
-    dwc_terms = populate_dropdown_lists(dwc_terms, config)
-    cf_standard_names = populate_dropdown_lists(cf_standard_names, config)
+    # Getting setup specific to this configuration
+    # The snapshot is shared between requests; the output config dictionary is a copy for this request
+    snapshot = get_config_snapshot(FIELDS_FILEPATH, config, subconfig)
+    output_config_dict = snapshot.get_output_config_dict()
+    extra_fields_dict = snapshot.extra_fields_dict
+    cf_standard_names = snapshot.cf_standard_names
+    groups = snapshot.groups
+    sheets_descriptions = snapshot.sheets_descriptions
+
+    # Fields selected in the form, parsed once
+    selection = FormSelection(list(request.form.keys()))
 
     # Creating a dictionary of all the fields.
     all_fields_dict = extra_fields_dict.copy()
@@ -90,9 +137,8 @@ def home(config):
         added_sheet = request.form.get("submitbutton", None)
         if 'add_'+sheet == added_sheet:
             output_config_dict[sheet]['Required CSV'] = True
-        for key, val in request.form.items():
-            if key.startswith(sheet):
-                output_config_dict[sheet]['Required CSV'] = True
+        if sheet in selection:
+            output_config_dict[sheet]['Required CSV'] = True
         if 'remove_'+sheet == added_sheet:
             output_config_dict[sheet]['Required CSV'] = False
         for key in output_config_dict[sheet].keys():
@@ -114,23 +160,13 @@ def home(config):
             added_cf_names_dic[sheet] = {}
             added_dwc_terms_dic[sheet] = {}
             added_fields_dic[sheet] = {}
-            dwc_terms_tmp = dwc_terms
-            for key in output_config_dict[sheet].keys():
-                if key not in ['Required CSV', 'Source']:
-                    fields_accounted_for = output_config_dict[sheet][key].keys()
-                    idxs_to_remove = []
-                    for idx, dwc_term in enumerate(dwc_terms_tmp):
-                        if dwc_term['id'] in fields_accounted_for:
-                            idxs_to_remove.append(idx)
-                    dwc_terms_to_keep = [dwc_terms_tmp[i] for i in range(len(dwc_terms_tmp)) if i not in idxs_to_remove]
-                    dwc_terms_tmp = dwc_terms_to_keep
-            dwc_terms_by_sheet[sheet] = dwc_terms_tmp
+            dwc_terms_by_sheet[sheet] = snapshot.dwc_terms_by_sheet[sheet]
 
     if request.method == "GET":
 
-        log_visit(ip_address, DB_PATH)
+        log_visit_in_background(ip_address, DB_PATH)
 
-        return print_html_template(
+        html = print_html_template(
             output_config_dict=output_config_dict,
             extra_fields_dict=extra_fields_dict,
             groups=groups,
@@ -145,75 +181,30 @@ def home(config):
             config=config,
             subconfig=subconfig,
             compulsary_sheets=compulsary_sheets,
-            sheets_descriptions = sheets_descriptions
+            sheets_descriptions = sheets_descriptions,
+            term_list_keys = snapshot.term_list_keys
         )
+        response = make_response(html)
+        if etag is not None:
+            page_cache.set(etag, html)
+            with_page_etag(response, etag)
+        return response
 
     if 'submitbutton' in request.form:
 
-        all_form_keys = list(request.form.keys())
-
-        # Removing bounds key if coordinate not selected
-        keys_to_remove = []
-        key_set = set(all_form_keys)
-
-        for key in all_form_keys:
-            if key.endswith('_bounds'):
-                # Check if a corresponding key without '_bounds' exists
-                base_key = key[:-len('_bounds')]
-                if base_key not in key_set:
-                    keys_to_remove.append(key)
-
-        for key in keys_to_remove:
-            all_form_keys.remove(key)
-
-        # CF standard names
-        for field in cf_standard_names:
-            for sheet in template_fields_dict.keys():
-                for form_key in all_form_keys:
-                    if form_key.startswith(sheet):
-                        form_field = form_key.split('__')[1]
-                        if field['id'] == form_field and field['id'] not in output_config_dict[sheet]:
-                            template_fields_dict[sheet][field['id']] = {}
-                            template_fields_dict[sheet][field['id']]['disp_name'] = field['id']
-                            template_fields_dict[sheet][field['id']]['valid'] = field['valid']
-                            if field["description"] == None:
-                                field["description"] = ""
-                            template_fields_dict[sheet][field['id']]['description'] = f"{field['description']} \ncanonical units: {field['canonical_units']}"
-                            template_fields_dict[sheet][field['id']]['format'] = "double precision"
-                            added_cf_names_dic[sheet][field['id']] = template_fields_dict[sheet][field['id']]
-
-        # DWC terms
-        for sheet in dwc_terms_by_sheet.keys():
-            for term in dwc_terms_by_sheet[sheet]:
-                for form_key in all_form_keys:
-                    if form_key.startswith(sheet):
-                        form_field = form_key.split('__')[1]
-                        if term['id'] == form_field and term['id'] not in output_config_dict[sheet]:
-                            template_fields_dict[sheet][term['id']] = {}
-                            template_fields_dict[sheet][term['id']]['disp_name'] = term['id']
-                            if term["description"] == None:
-                                term["description"] = ""
-                            template_fields_dict[sheet][term['id']]['description'] = term['description']
-                            template_fields_dict[sheet][term['id']]['format'] = "double precision"
-                            template_fields_dict[sheet][term['id']]['valid'] = term['valid']
-                            added_dwc_terms_dic[sheet][term['id']] = template_fields_dict[sheet][term['id']]
-
-        # Other fields (not CF standard names or DwC terms - terms designed for the template generator and logging system)
-        for sheet in template_fields_dict.keys():
-            for form_key in all_form_keys:
-                if form_key.startswith(sheet):
-                    form_field = form_key.split('__')[1]
-                    if form_field not in added_cf_names_dic[sheet].keys() and form_field not in added_dwc_terms_dic[sheet].keys():
-                        template_fields_dict[sheet][form_field] = all_fields_dict[form_field] # fields to write to template
-                        if form_field in extra_fields_dict.keys():
-                            added_fields_dic[sheet][form_field] = extra_fields_dict[form_field] # Extra fields added to template generator interface by user
+        (
+            template_fields_dict,
+            added_cf_names_dic,
+            added_dwc_terms_dic,
+            added_fields_dic
+        ) = resolve_selection(selection, snapshot, output_config_dict, all_fields_dict, list(template_fields_dict.keys()))
 
         for sheet in output_config_dict.keys():
             for key in output_config_dict[sheet].keys():
                 if key not in ['Required CSV', 'Source']:
                     for field, values in output_config_dict[sheet][key].items():
                         if sheet + '__' + field in request.form:
-                            output_config_dict[sheet][key][field]["checked"] = "yes"
+                            output_config_dict[sheet][key][field] = dict(values, checked="yes")
 
         if request.form["submitbutton"] == "generateTemplate":
 
@@ -231,24 +222,21 @@ def home(config):
 
             log_template(ip_address, config, subconfig, sheets, DB_PATH)
 
-            filepath = "/tmp/Nansen_Legacy_template.xlsx"
-
             if config == 'Darwin Core':
                 metadata = False
             else:
                 metadata = True
 
-            create_template(
-                filepath,
-                template_fields_dict,
-                sheets_info,
-                FIELDS_FILEPATH,
-                config,
-                subconfig,
-                conversions=True,
-                metadata = metadata
-            )
-            return send_file(filepath, as_attachment=True)
+            template_args = {
+                'template_fields_dict': template_fields_dict,
+                'sheets_info': sheets_info,
+                'fields_filepath': FIELDS_FILEPATH,
+                'config': config,
+                'subconfig': subconfig,
+                'conversions': True,
+                'metadata': metadata
+            }
+            return send_workbook(template_args, 'Nansen_Legacy_template.xlsx')
 
         else:
             return print_html_template(
@@ -266,7 +254,8 @@ def home(config):
                 config=config,
                 subconfig=subconfig,
                 compulsary_sheets=compulsary_sheets,
-                sheets_descriptions = sheets_descriptions
+                sheets_descriptions = sheets_descriptions,
+                term_list_keys = snapshot.term_list_keys
             )
     elif 'select-config' in request.form:
 
@@ -294,7 +283,8 @@ def home(config):
             config=config,
             subconfig=subconfig,
             compulsary_sheets=compulsary_sheets,
-            sheets_descriptions = sheets_descriptions
+            sheets_descriptions = sheets_descriptions,
+            term_list_keys = snapshot.term_list_keys
         )
 
 @app.route("/update", methods=["GET", "POST"])
@@ -332,9 +322,143 @@ def update_config():
                 for error in errors:
                     flash(error, category='error')
 
+        # Keep the compiled catalogue in line with the source files that were pulled
+        try:
+            compile_catalogues(FIELDS_FILEPATH)
+        except Exception as e:
+            flash(f'Could not compile the field catalogues, the source files will be used instead: {e}', category='warning')
+
+        # Pages and workbooks generated from the previous catalogues are no longer served
+        page_cache.clear()
+        workbook_cache.clear()
+        refresh_static_signature()
+
     return render_template(
         "update_terms.html"
     )
 
+@app.route("/api/terms", methods=["GET"])
+def api_terms():
+    '''
+    Page of the CF standard names, Darwin Core terms or other fields that can be added to a sheet, as JSON.
+
+    Query parameters: catalogue ('cf', 'dwc' or 'other'), config, subconfig, sheet, q (search words),
+    page (starting at 1) and page_size
+    '''
+    BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+    FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+    config = request.args.get('config', 'CF-NetCDF')
+    subconfig = request.args.get('subconfig') or None
+    if config not in get_list_of_configs():
+        return jsonify({'error': f"Unknown configuration '{config}'"}), 400
+    list_of_subconfigs = get_list_of_subconfigs(config=config)
+    if list_of_subconfigs and subconfig not in list_of_subconfigs:
+        return jsonify({'error': f"Unknown subconfiguration '{subconfig}'"}), 400
+    if not list_of_subconfigs:
+        subconfig = None
+
+    try:
+        page = int(request.args.get('page', 1))
+        page_size = int(request.args.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'page and page_size must be integers'}), 400
+
+    snapshot = get_config_snapshot(FIELDS_FILEPATH, config, subconfig)
+    try:
+        term_page = get_term_page(
+            snapshot,
+            catalogue=request.args.get('catalogue', 'cf'),
+            sheet=request.args.get('sheet', ''),
+            q=request.args.get('q', ''),
+            page=page,
+            page_size=page_size
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(term_page)
+
+@app.route("/api/template", methods=["POST"])
+def api_template():
+    '''
+    Generate a template from a JSON specification, without going through the form of the home page.
+
+    Body: {"config": ..., "subconfig": ..., "sheets": {sheet: [field ids]}, "split_personnel_columns": false, "filename": ...}
+    See website/lib/template_spec.py
+    '''
+    BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+    FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+    spec = request.get_json(silent=True)
+    try:
+        spec = parse_template_spec(spec)
+        template_args = resolve_template_spec(spec, FIELDS_FILEPATH)
+    except TemplateSpecError as e:
+        return jsonify({'error': str(e)}), 400
+
+    log_template(request.remote_addr, spec['config'], spec['subconfig'], template_args['sheets_info'].keys(), DB_PATH)
+
+    return send_workbook(template_args, spec['filename'])
+
+@app.route("/api/templates", methods=["POST"])
+def api_templates():
+    '''
+    Generate a batch of templates in a pool of processes, streamed back as one zip as they complete.
+
+    Body: {"templates": [template specifications, as for /api/template]}
+    Templates that could not be generated are listed in errors.json in the zip.
+    '''
+    BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+    FIELDS_FILEPATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+    body = request.get_json(silent=True)
+    specs = body.get('templates') if isinstance(body, dict) else None
+    if not isinstance(specs, list) or len(specs) == 0:
+        return jsonify({'error': "The body must be an object with a non-empty list of 'templates'"}), 400
+    if len(specs) > BATCH_MAX_TEMPLATES:
+        return jsonify({'error': f'At most {BATCH_MAX_TEMPLATES} templates can be generated at once'}), 400
+
+    # The whole batch is checked before any template is generated
+    parsed_specs = []
+    jobs_args = []
+    for idx, spec in enumerate(specs):
+        try:
+            spec = parse_template_spec(spec)
+            jobs_args.append(resolve_template_spec(spec, FIELDS_FILEPATH))
+        except TemplateSpecError as e:
+            return jsonify({'error': f'Template {idx}: {e}'}), 400
+        parsed_specs.append(spec)
+
+    filenames = unique_filenames([spec['filename'] for spec in parsed_specs])
+
+    log_templates(
+        request.remote_addr,
+        [(spec['config'], spec['subconfig'], template_args['sheets_info'].keys()) for spec, template_args in zip(parsed_specs, jobs_args)],
+        DB_PATH
+    )
+
+    chunks = iter_batch_zip(
+        list(zip(filenames, jobs_args)),
+        batch_pool,
+        timeout=app.config['BATCH_JOB_TIMEOUT'],
+        workbook_cache=workbook_cache
+    )
+    return Response(chunks, mimetype='application/zip', headers={'Content-Disposition': 'attachment; filename=templates.zip'})
+
+@app.route("/stats/page-cache", methods=["GET"])
+def page_cache_stats():
+    '''
+    Hit and miss counters of the rendered page cache
+    '''
+    return jsonify(page_cache.stats())
+
+@app.route("/stats/workbook-cache", methods=["GET"])
+def workbook_cache_stats():
+    '''
+    Hit and miss counters of the generated workbook cache
+    '''
+    return jsonify(workbook_cache.stats())
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,22 @@
+import os
+import pytest
+
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIELDS_PATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
+
+# Workbooks generated by the tests are not kept on disk
+os.environ.setdefault('WORKBOOK_CACHE_DIR', '')
+
+@pytest.fixture(scope='session')
+def fields_path():
+    '''
+    Directory of the field catalogues, which must have been pulled with `make update-config`
+    '''
+    if not os.path.exists(os.path.join(FIELDS_PATH, 'cf_standard_names.json')):
+        pytest.skip('The field catalogues have not been pulled, run `make update-config`')
+    return FIELDS_PATH
+
+@pytest.fixture(scope='session')
+def client(fields_path):
+    import main
+    return main.app.test_client()
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+from website.lib.form_selection import FormSelection, resolve_selection
+
+def test_keys_by_sheet_in_form_order():
+    selection = FormSelection(['submitbutton', 'Data__time', 'Data__depth', 'Metadata__title', 'Data__time', 'Data__latitude'])
+    assert selection.get_fields('Data') == ['time', 'depth', 'latitude']
+    assert selection.get_fields('Metadata') == ['title']
+    assert selection.get_fields('Other') == []
+    assert 'Data' in selection and 'submitbutton' not in selection
+
+def test_sheets_are_matched_exactly():
+    selection = FormSelection(['Event Core__eventID', 'Event__x', 'Data2__y', 'Occurrence Extension__occurrenceID'])
+    assert selection.get_fields('Event') == ['x']
+    assert selection.get_fields('Event Core') == ['eventID']
+    assert selection.get_fields('Data') == []
+    assert selection.get_fields('Occurrence') == []
+    assert 'Data' not in selection
+
+def test_bounds_need_their_coordinate():
+    selection = FormSelection(['Data__depth', 'Data__depth_bounds', 'Data__time_bounds', 'Other__time', 'Other__time_bounds'])
+    assert selection.get_fields('Data') == ['depth', 'depth_bounds']
+    assert selection.get_fields('Other') == ['time', 'time_bounds']
+
+def test_sheet_with_only_left_out_bounds():
+    selection = FormSelection(['Data__time_bounds'])
+    assert 'Data' in selection
+    assert selection.get_fields('Data') == []
+
+def field(field_id, description='Description'):
+    return {'id': field_id, 'description': description, 'valid': {'validate': 'any'}, 'canonical_units': 'K'}
+
+def snapshot():
+    cf_standard_names = (field('sea_water_temperature'), field('air_temperature', None), field('depth'), field('time'))
+    dwc_terms = (field('eventID'), field('eventDate', None), field('scientificName'))
+    return SimpleNamespace(
+        cf_standard_names=cf_standard_names,
+        cf_standard_name_positions={term['id']: idx for idx, term in enumerate(cf_standard_names)},
+        dwc_terms=dwc_terms,
+        dwc_term_positions={term['id']: idx for idx, term in enumerate(dwc_terms)},
+        dwc_term_ids_by_sheet={'Data': frozenset(['eventDate', 'scientificName'])},
+        extra_fields_dict={'comments': {'disp_name': 'Comments'}}
+    )
+
+def test_column_order():
+    # CF standard names then Darwin Core terms in the order of their catalogues, then the other fields in the order of the form
+    output_config_dict = {'Data': {'Required': {'eventID': {}}}}
+    all_fields_dict = {'eventID': {'disp_name': 'Event ID'}, 'comments': {'disp_name': 'Comments'}, 'pi_name': {'disp_name': 'PI name'}}
+    selection = FormSelection([
+        'Data__comments', 'Data__time', 'Data__scientificName', 'Data__eventID', 'Data__sea_water_temperature',
+        'Data__eventDate', 'Data__pi_name', 'Data__depth'
+    ])
+
+    template_fields_dict, added_cf_names_dic, added_dwc_terms_dic, added_fields_dic = resolve_selection(
+        selection, snapshot(), output_config_dict, all_fields_dict, ['Data'])
+
+    assert list(template_fields_dict['Data']) == [
+        'sea_water_temperature', 'depth', 'time', 'eventDate', 'scientificName', 'comments', 'eventID', 'pi_name'
+    ]
+    assert list(added_cf_names_dic['Data']) == ['sea_water_temperature', 'depth', 'time']
+    assert list(added_dwc_terms_dic['Data']) == ['eventDate', 'scientificName']
+    assert list(added_fields_dic['Data']) == ['comments']
+    assert template_fields_dict['Data']['eventID'] is all_fields_dict['eventID']
+
+def test_missing_descriptions_are_not_written_to_the_catalogue():
+    terms = snapshot()
+    template_fields_dict, _, _, _ = resolve_selection(
+        FormSelection(['Data__air_temperature', 'Data__eventDate']), terms, {'Data': {}}, {}, ['Data'])
+    assert template_fields_dict['Data']['air_temperature']['description'] == ' \ncanonical units: K'
+    assert template_fields_dict['Data']['eventDate']['description'] == ''
+    assert terms.cf_standard_names[1]['description'] is None
+    assert terms.dwc_terms[1]['description'] is None
+
+def test_sheets_without_selected_fields():
+    template_fields_dict, _, _, _ = resolve_selection(FormSelection([]), snapshot(), {'Data': {}}, {}, ['Data'])
+    assert template_fields_dict == {'Data': {}}
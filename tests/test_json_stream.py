@@ -0,0 +1,116 @@
+import io
+import json
+import pytest
+from website.lib.json_stream import iter_records
+from website.lib.pull_cf_standard_names import CF_standard_names_json, CF_STANDARD_NAME_ATTRIBUTES
+from website.lib.pull_darwin_core_terms import Darwin_Core_Terms_json, Darwin_Core_Extension, TERM_ATTRIBUTES
+
+RECORDS = [
+    {'id': 'sea_water_temperature', 'description': 'Temperature of "sea water", in K', 'valid': {'validate': 'decimal', 'value': '-1e100'}},
+    {'id': 'depth', 'description': 'Distance below the surface æøå', 'canonical_units': 'm', 'count': 12345678},
+    {'id': 'empty', 'values': [], 'nested': {'list': [1.5, -2e10, None, True, False]}},
+]
+
+def records_from(text, chunk_size, **kwargs):
+    return list(iter_records(io.StringIO(text), chunk_size=chunk_size, **kwargs))
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 65536])
+def test_values_split_across_chunks(chunk_size):
+    text = json.dumps(RECORDS, indent=4, ensure_ascii=False)
+    assert records_from(text, chunk_size) == RECORDS
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 65536])
+def test_number_at_chunk_boundary(chunk_size):
+    # Numbers are the only values that do not end with a delimiter of their own
+    assert records_from('[1234567890, 0.5e-3,7]', chunk_size) == [1234567890, 0.5e-3, 7]
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 65536])
+def test_whitespace_and_commas_between_records(chunk_size):
+    text = ' \n[\n\t{"id": "a"}  ,\r\n  {"id": "b"}\n,{"id":"c"}\n]\n '
+    assert records_from(text, chunk_size) == [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]
+
+@pytest.mark.parametrize('text', ['[]', '  [ ]  ', '{"terms": []}', '{}'])
+def test_empty(text):
+    key = 'terms' if text.strip().startswith('{') else None
+    assert records_from(text, 2, key=key) == []
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 65536])
+@pytest.mark.parametrize('text', [
+    '[{"id": "a"}, {"id": "b"',
+    '[{"id": "a"}, {"id": "b"}',
+    '[{"id": "a"},',
+    '[123',
+    '',
+])
+def test_truncated_file(text, chunk_size):
+    with pytest.raises(ValueError):
+        records_from(text, chunk_size)
+
+def test_records_before_truncation_are_yielded():
+    records = iter_records(io.StringIO('[{"id": "a"}, {"id": "b"'), chunk_size=4)
+    assert next(records) == {'id': 'a'}
+    with pytest.raises(ValueError):
+        next(records)
+
+def test_missing_comma():
+    with pytest.raises(ValueError):
+        records_from('[{"id": "a"} {"id": "b"}]', 3)
+
+@pytest.mark.parametrize('chunk_size', [1, 6, 65536])
+def test_records_under_key_and_other_members(chunk_size):
+    document = {'name': 'Event', 'terms': RECORDS, 'description': 'Core of events', 'version': 2}
+    other_members = {}
+    records = records_from(json.dumps(document), chunk_size, key='terms', on_value=other_members.__setitem__)
+    assert records == RECORDS
+    assert other_members == {'name': 'Event', 'description': 'Core of events', 'version': 2}
+
+def test_attributes():
+    records = records_from(json.dumps(RECORDS), 5, attributes=['id', 'canonical_units'])
+    assert records == [{'id': 'sea_water_temperature'}, {'id': 'depth', 'canonical_units': 'm'}, {'id': 'empty'}]
+
+def catalogue_record(attributes):
+    record = {attribute: f'{attribute} value' for attribute in attributes}
+    record.update({'id': 'x', 'valid': {'validate': 'any', 'input_title': 'x'}, 'extra': 'not projected', 'term_iri': 'http://example.org/x'})
+    return record
+
+def test_cf_standard_names_projected(tmp_path):
+    records = [catalogue_record(CF_STANDARD_NAME_ATTRIBUTES), {'id': 'y', 'description': 'y only'}]
+    with open(tmp_path / 'cf_standard_names.json', 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=4)
+
+    cf_standard_names = CF_standard_names_json(str(tmp_path))
+    cf_standard_names.load_json(projected=False)
+    assert cf_standard_names.dic == records
+
+    cf_standard_names.load_json(projected=True)
+    assert cf_standard_names.dic == [
+        {attribute: records[0][attribute] for attribute in CF_STANDARD_NAME_ATTRIBUTES},
+        {'id': 'y', 'description': 'y only'}
+    ]
+
+def test_dwc_terms_projected(tmp_path):
+    records = [catalogue_record(TERM_ATTRIBUTES + ['term_localName'])]
+    with open(tmp_path / 'dwc_terms.json', 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=4)
+
+    dwc_terms = Darwin_Core_Terms_json(str(tmp_path))
+    dwc_terms.load_json(projected=False)
+    assert dwc_terms.dic == records
+
+    dwc_terms.load_json(projected=True)
+    assert dwc_terms.dic == [{attribute: records[0][attribute] for attribute in TERM_ATTRIBUTES}]
+
+def test_dwc_extension_projected(tmp_path):
+    content = {'terms': [catalogue_record(TERM_ATTRIBUTES)], 'description': 'Terms of an extension'}
+    filename = str(tmp_path / 'dwc_extension.json')
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(content, f, indent=4)
+
+    dwc_extension = Darwin_Core_Extension('https://example.org/extension.xml', filename)
+    dwc_extension.load_json(projected=False)
+    assert dwc_extension.dic == content['terms']
+    assert dwc_extension.description == 'Terms of an extension'
+
+    dwc_extension.load_json(projected=True)
+    assert dwc_extension.dic == [{attribute: content['terms'][0][attribute] for attribute in TERM_ATTRIBUTES}]
+    assert dwc_extension.description == 'Terms of an extension'
@@ -0,0 +1,81 @@
+import pytest
+from website.lib.config_model import get_config_model
+from website.lib.template_spec import parse_template_spec, resolve_template_spec, TemplateSpecError, DEFAULT_FILENAME, MAX_END_ROW
+from website.lib.create_template import DEFAULT_END_ROW
+
+ACTIVITIES = {'config': 'Nansen Legacy logging system', 'subconfig': 'Activities'}
+
+def test_defaults():
+    spec = parse_template_spec({'config': 'CF-NetCDF', 'subconfig': 'ignored'})
+    assert spec == {
+        'config': 'CF-NetCDF',
+        'subconfig': None,
+        'sheets': {},
+        'split_personnel_columns': False,
+        'end_row': DEFAULT_END_ROW,
+        'filename': DEFAULT_FILENAME
+    }
+
+def test_filename_gets_extension():
+    assert parse_template_spec(dict(ACTIVITIES, filename='activities'))['filename'] == 'activities.xlsx'
+    assert parse_template_spec(dict(ACTIVITIES, filename='activities.xlsx'))['filename'] == 'activities.xlsx'
+
+@pytest.mark.parametrize('spec', [
+    ['CF-NetCDF'],
+    'CF-NetCDF',
+    {},
+    {'config': 'Unknown'},
+    {'config': 'Nansen Legacy logging system'},
+    {'config': 'Nansen Legacy logging system', 'subconfig': 'Unknown'},
+    dict(ACTIVITIES, sheets=['Data']),
+    dict(ACTIVITIES, sheets={'Data': 'eventDate'}),
+    dict(ACTIVITIES, sheets={'Data': ['eventDate', 3]}),
+    dict(ACTIVITIES, split_personnel_columns='yes'),
+    dict(ACTIVITIES, end_row=0),
+    dict(ACTIVITIES, end_row=MAX_END_ROW + 1),
+    dict(ACTIVITIES, end_row=100.5),
+    dict(ACTIVITIES, end_row=True),
+    dict(ACTIVITIES, filename='../activities.xlsx'),
+    dict(ACTIVITIES, filename='/tmp/activities.xlsx'),
+    dict(ACTIVITIES, filename=42),
+])
+def test_rejected_specs(spec):
+    with pytest.raises(TemplateSpecError):
+        parse_template_spec(spec)
+
+def test_rejected_specs_are_value_errors():
+    assert issubclass(TemplateSpecError, ValueError)
+
+def required_fields(config, subconfig, sheet):
+    return get_config_model().get_sheet_requirements(config, subconfig, sheet).required
+
+def test_required_fields_are_always_included(fields_path):
+    template_args = resolve_template_spec(parse_template_spec(ACTIVITIES), fields_path)
+    fields = list(template_args['template_fields_dict']['Data'])
+    required = required_fields('Nansen Legacy logging system', 'Activities', 'Data')
+    assert required and required <= set(fields)
+
+def test_selected_fields_follow_the_required_fields(fields_path):
+    spec = parse_template_spec(dict(ACTIVITIES, sheets={'Data': ['comments1']}, split_personnel_columns=True, end_row=500))
+    template_args = resolve_template_spec(spec, fields_path)
+    fields = list(template_args['template_fields_dict']['Data'])
+    required = required_fields('Nansen Legacy logging system', 'Activities', 'Data')
+    assert set(fields) == required | {'comments1'}
+    assert (template_args['split_personnel_columns'], template_args['end_row']) == (True, 500)
+    assert template_args['metadata'] is True
+
+def test_required_sheets_are_always_included(fields_path):
+    spec = parse_template_spec({'config': 'Darwin Core', 'subconfig': 'Sampling Event'})
+    template_args = resolve_template_spec(spec, fields_path)
+    for sheet in ['Event Core', 'Occurrence Extension']:
+        assert required_fields('Darwin Core', 'Sampling Event', sheet) <= set(template_args['template_fields_dict'][sheet])
+    assert 'Extended MoF Extension' not in template_args['template_fields_dict']
+    assert template_args['metadata'] is False
+
+@pytest.mark.parametrize('sheets', [
+    {'Unknown sheet': []},
+    {'Data': ['not_a_field']},
+])
+def test_unresolved_specs(fields_path, sheets):
+    with pytest.raises(TemplateSpecError):
+        resolve_template_spec(parse_template_spec(dict(ACTIVITIES, sheets=sheets)), fields_path)
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+import pytest
+from website.lib.search_index import SearchIndex, tokenize
+from website.lib.term_picker import get_term_page, MAX_PAGE_SIZE
+
+@pytest.mark.parametrize('text, words', [
+    ('sea_water_temperature', ['sea', 'water', 'temperature']),
+    ('minimumDepthInMeters', ['minimum', 'depth', 'in', 'meters']),
+    ('decimalLatitude', ['decimal', 'latitude']),
+    ('CTD bottle, no. 12', ['ctd', 'bottle', 'no', '12']),
+    ('sea_water_pH_reported_on_total_scale', ['sea', 'water', 'p', 'h', 'reported', 'on', 'total', 'scale']),
+    ('Station near Tromsø (NLEG01)', ['station', 'near', 'tromsø', 'nleg', '01']),
+    ('', []),
+    (None, []),
+])
+def test_tokenize(text, words):
+    assert tokenize(text) == words
+
+FIELDS = (
+    {'id': 'sea_water_temperature', 'description': 'Temperature of sea water'},
+    {'id': 'air_temperature', 'description': 'Temperature of the air'},
+    {'id': 'sea_water_salinity', 'description': 'Salt content of sea water'},
+    {'id': 'minimumDepthInMeters', 'description': 'The lesser depth of a range of depth'},
+    {'id': 'temperature', 'description': 'Temperature'},
+    {'id': 'stationName', 'description': 'Name of the station, e.g. Tromsø'},
+)
+
+def ids(fields):
+    return [field['id'] for field in fields]
+
+@pytest.fixture(scope='module')
+def search_index():
+    return SearchIndex(FIELDS)
+
+def test_every_query_word_must_match(search_index):
+    assert ids(search_index.search('sea temp')) == ['sea_water_temperature']
+
+def test_query_words_are_prefixes_of_words(search_index):
+    assert ids(search_index.search('min dep')) == ['minimumDepthInMeters']
+    assert ids(search_index.search('salt')) == ['sea_water_salinity']
+
+def test_middle_of_word_does_not_match(search_index):
+    assert search_index.search('perature') == []
+
+def test_non_ascii_words(search_index):
+    assert ids(search_index.search('tromsø')) == ['stationName']
+    assert ids(search_index.search('Troms')) == ['stationName']
+
+def test_ranking(search_index):
+    # The exact id first, then whole words of the id, then prefixes, then matches in the description
+    assert ids(search_index.search('temperature')) == ['temperature', 'sea_water_temperature', 'air_temperature']
+    assert ids(search_index.search('water')) == ['sea_water_temperature', 'sea_water_salinity']
+    assert ids(search_index.search('sal')) == ['sea_water_salinity']
+
+def test_empty_query_returns_all_fields_in_order(search_index):
+    assert search_index.search_positions('  ') == list(range(len(FIELDS)))
+
+def test_limit(search_index):
+    assert len(search_index.search('temperature', limit=2)) == 2
+
+def snapshot(terms, list_key):
+    return SimpleNamespace(
+        fields_filepath=None,
+        output_config_dict={'Data': {}},
+        cf_standard_names=terms,
+        term_list_keys={'cf': {'Data': list_key}}
+    )
+
+def test_term_pages():
+    terms = tuple({'id': f'term_{idx}', 'description': None} for idx in range(25))
+    picker = snapshot(terms, 'test_term_pages')
+
+    first = get_term_page(picker, 'cf', 'Data', page=1, page_size=10)
+    assert (first['total'], first['pages'], first['page'], first['sheet']) == (25, 3, 1, 'Data')
+    assert [term['id'] for term in first['terms']] == [f'term_{idx}' for idx in range(10)]
+    assert first['terms'][0]['description'] == ''
+
+    last = get_term_page(picker, 'cf', 'Data', page=3, page_size=10)
+    assert [term['id'] for term in last['terms']] == [f'term_{idx}' for idx in range(20, 25)]
+
+    assert get_term_page(picker, 'cf', 'Data', page=4, page_size=10)['terms'] == []
+    # Pages start at 1, and their size is bounded
+    assert get_term_page(picker, 'cf', 'Data', page=0, page_size=10)['page'] == 1
+    assert get_term_page(picker, 'cf', 'Data', page_size=MAX_PAGE_SIZE + 1)['page_size'] == MAX_PAGE_SIZE
+    assert get_term_page(picker, 'cf', 'Data', page_size=0)['page_size'] == 1
+
+def test_term_pages_of_empty_list():
+    term_page = get_term_page(snapshot((), 'test_term_pages_of_empty_list'), 'cf', 'Data')
+    assert (term_page['total'], term_page['pages'], term_page['terms']) == (0, 1, [])
+
+@pytest.mark.parametrize('catalogue, sheet', [('unknown', 'Data'), ('cf', 'Unknown sheet')])
+def test_term_page_of_unknown_catalogue_or_sheet(catalogue, sheet):
+    with pytest.raises(ValueError):
+        get_term_page(snapshot((), 'test_term_page_errors'), catalogue, sheet)
+
+@pytest.mark.parametrize('query', [
+    'config=Unknown',
+    'config=Darwin Core&subconfig=Unknown',
+    'config=Darwin Core',
+    'config=CF-NetCDF&page=first',
+    'config=CF-NetCDF&page_size=1.5',
+    'config=CF-NetCDF&catalogue=unknown&sheet=Data',
+    'config=CF-NetCDF&catalogue=cf&sheet=Unknown',
+])
+def test_api_terms_errors(client, query):
+    response = client.get('/api/terms?' + query)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_api_terms(client):
+    response = client.get('/api/terms?config=CF-NetCDF&catalogue=cf&sheet=Data&q=sea water temperature&page_size=5')
+    assert response.status_code == 200
+    term_page = response.get_json()
+    assert term_page['page'] == 1 and term_page['page_size'] == 5
+    assert 0 < len(term_page['terms']) <= 5
+    for term in term_page['terms']:
+        words = tokenize(term['id']) + tokenize(term['description'])
+        assert all(any(word.startswith(query_word) for word in words) for query_word in ['sea', 'water', 'temperature'])
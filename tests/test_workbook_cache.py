@@ -0,0 +1,113 @@
+import os
+from types import SimpleNamespace
+import pytest
+from website.lib import workbook_cache as workbook_cache_module
+from website.lib.workbook_cache import WorkbookCache, workbook_key, template_source_files, CF_ATTRIBUTES_PATH
+
+@pytest.fixture
+def versions(monkeypatch, tmp_path):
+    '''
+    Versions of the field registry and of the source files of the workbooks, that the tests can change
+    '''
+    registry = SimpleNamespace(version='registry 1')
+    source_file = tmp_path / 'readme.txt'
+    source_file.write_text('Readme')
+    monkeypatch.setattr(workbook_cache_module, 'get_field_registry', lambda fields_filepath: registry)
+    monkeypatch.setattr(workbook_cache_module, 'template_source_files', lambda fields_filepath: [str(source_file)])
+    return SimpleNamespace(registry=registry, source_file=source_file)
+
+def template_args(**kwargs):
+    args = {
+        'template_fields_dict': {'Data': {'time': {'disp_name': 'time'}, 'depth': {'disp_name': 'depth'}}},
+        'sheets_info': {'Data': {'description': 'Data', 'source': None}},
+        'fields_filepath': '/fields',
+        'config': 'CF-NetCDF',
+        'subconfig': None,
+        'conversions': True,
+        'metadata': True,
+        'split_personnel_columns': False
+    }
+    args.update(kwargs)
+    return args
+
+def test_same_template_same_key(versions):
+    key = workbook_key(template_args())
+    assert key == workbook_key(template_args()) and len(key) == 64
+
+@pytest.mark.parametrize('changes', [
+    {'template_fields_dict': {'Data': {'depth': {}, 'time': {}}}},
+    {'template_fields_dict': {'Data': {'time': {}}}},
+    {'config': 'Nansen Legacy logging system', 'subconfig': 'Activities'},
+    {'metadata': False},
+    {'conversions': False},
+    {'split_personnel_columns': True},
+    {'streaming': True},
+    {'end_row': 500},
+])
+def test_key_depends_on_the_template(versions, changes):
+    assert workbook_key(template_args(**changes)) != workbook_key(template_args())
+
+def test_key_changes_with_the_registry(versions):
+    key = workbook_key(template_args())
+    versions.registry.version = 'registry 2'
+    assert workbook_key(template_args()) != key
+
+def test_key_changes_with_the_source_files(versions):
+    key = workbook_key(template_args())
+    versions.source_file.write_text('Edited readme')
+    assert workbook_key(template_args()) != key
+
+def test_prefilled_workbooks_are_not_cached(versions):
+    fields = {'Data': {'time': {'disp_name': 'time', 'data': [1, 2, 3]}}}
+    assert workbook_key(template_args(template_fields_dict=fields)) is None
+    assert workbook_key(template_args(global_attributes_df=object())) is None
+
+def test_source_files():
+    fields_filepath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'website', 'config', 'fields')
+    filepaths = template_source_files(fields_filepath)
+    assert filepaths[0] == workbook_cache_module.create_template_module.__file__
+    readmes = [os.path.basename(filepath) for filepath in filepaths if os.path.dirname(filepath).endswith('readmes')]
+    assert readmes == ['cfnetcdf_readme.txt', 'dwc_readme.txt', 'nl_readme.txt']
+    assert any(filepath.startswith(CF_ATTRIBUTES_PATH) for filepath in filepaths)
+
+def test_get_and_set():
+    cache = WorkbookCache(max_bytes=10)
+    assert cache.get('a') is None
+    cache.set('a', b'12345')
+    cache.set(None, b'123')
+    assert cache.get('a') == b'12345'
+    assert cache.get(None) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_are_evicted():
+    cache = WorkbookCache(max_bytes=10)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    cache.get('a')
+    cache.set('c', b'1234')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1234' and cache.get('c') == b'1234'
+    cache.set('too large', b'12345678901')
+    assert cache.get('too large') is None
+
+def test_disk(tmp_path):
+    directory = str(tmp_path / 'workbooks')
+    cache = WorkbookCache(max_bytes=0, directory=directory, max_disk_bytes=10)
+    assert oct(os.stat(directory).st_mode & 0o777) == oct(0o700)
+    cache.set('a', b'123456')
+    assert WorkbookCache(directory=directory).get('a') == b'123456'
+    cache.set('b', b'123456')
+    assert sorted(os.listdir(directory)) == ['b.xlsx']
+    cache.clear()
+    assert os.listdir(directory) == []
+
+def test_directory_open_to_other_users(tmp_path):
+    directory = tmp_path / 'workbooks'
+    directory.mkdir()
+    directory.chmod(0o777)
+    assert WorkbookCache(directory=str(directory)).directory is None
+
+def test_directory_link(tmp_path):
+    (tmp_path / 'workbooks').mkdir(mode=0o700)
+    os.symlink(tmp_path / 'workbooks', tmp_path / 'link')
+    assert WorkbookCache(directory=str(tmp_path / 'link')).directory is None
@@ -5,6 +5,7 @@ import os
 from website.lib.pull_cf_standard_names import cf_standard_names_update
 from website.lib.pull_global_attributes import global_attributes_update
 from website.lib.pull_darwin_core_terms import dwc_terms_update, dwc_extensions_update
+from website.lib.catalogues import compile_catalogues
 
 # available scopes
 GLOBAL = 'global'
@@ -30,3 +31,8 @@ for scope in scopes:
         print("Ignore unknown scope", scope)
 
     print("Updated", scope)
+
+# Compiled catalogue, loaded by the application at startup instead of the JSON files
+print("Compiling catalogues")
+compiled_filepath = compile_catalogues(FIELDS_FILEPATH)
+print("Compiled catalogues to", compiled_filepath)
@@ -5,9 +5,47 @@ import os
 BASE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CONFIG_PATH = os.path.join(BASE_PATH, 'website', 'config', 'template_configurations.yaml')
 DROPDOWNS_PATH = os.path.join(BASE_PATH, 'website', 'config', 'dropdown_lists')
+FIELDS_PATH = os.path.join(BASE_PATH, 'website', 'config', 'fields')
 
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = str(uuid.uuid4())
 
+    # Load the field catalogues once at startup rather than on every request
+    from .lib.field_registry import get_field_registry, set_dwc_extension_cache_budget
+    if 'DWC_EXTENSION_CACHE_TERMS' in os.environ:
+        set_dwc_extension_cache_budget(int(os.environ['DWC_EXTENSION_CACHE_TERMS']))
+    try:
+        app.extensions['field_registry'] = get_field_registry(FIELDS_PATH)
+    except FileNotFoundError as e:
+        # The catalogues can still be pulled from /update
+        app.logger.warning(f"Field catalogues not loaded at startup: {e}")
+
+    # Compressed responses, pre-compressed and fingerprinted static files
+    from .lib.compression import init_compression
+    init_compression(app)
+
+    # Rendered configuration pages
+    from .lib.http_cache import PageCache
+    app.extensions['page_cache'] = PageCache(
+        max_entries=int(os.environ.get('PAGE_CACHE_ENTRIES', 32)),
+        compress=os.environ.get('PAGE_CACHE_COMPRESS', '1') != '0'
+    )
+
+    # Generated workbooks, in memory and on disk, by default in the instance folder of the app.
+    # WORKBOOK_CACHE_DIR='' keeps them in memory only.
+    from .lib.workbook_cache import WorkbookCache
+    app.extensions['workbook_cache'] = WorkbookCache(
+        max_bytes=int(os.environ.get('WORKBOOK_CACHE_BYTES', 32 * 1024 * 1024)),
+        directory=os.environ.get('WORKBOOK_CACHE_DIR', os.path.join(app.instance_path, 'workbook_cache')) or None,
+        max_disk_bytes=int(os.environ.get('WORKBOOK_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+    )
+
+    # Batches of templates generated in a pool of processes
+    from .lib.batch_templates import BatchPool, BATCH_MAX_WORKERS, BATCH_JOB_TIMEOUT
+    app.config['BATCH_WORKERS'] = int(os.environ.get('BATCH_WORKERS', BATCH_MAX_WORKERS))
+    app.config['BATCH_JOB_TIMEOUT'] = float(os.environ.get('BATCH_JOB_TIMEOUT', BATCH_JOB_TIMEOUT))
+    # The processes are started with the first batch and shared by all batches
+    app.extensions['batch_pool'] = BatchPool(max_workers=app.config['BATCH_WORKERS'], fields_filepath=FIELDS_PATH)
+
     return app
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batches of templates, generated in a pool of processes
+
+The templates of a batch are described by template specifications (see template_spec.py),
+which are resolved in the calling process. Workbooks are written by a long-lived, bounded
+pool of worker processes, shared by all the batches of the server, and added to a zip as
+they complete, so that the zip can be streamed back while the rest of the batch is still
+being generated. Each worker loads the field registry once, when it starts.
+
+A template that fails or takes longer than the timeout is left out of the zip, and
+listed with its error in errors.json in the zip.
+"""
+
+import io
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from .create_template import create_template
+from .field_registry import get_field_registry
+from .workbook_cache import workbook_key
+
+logger = logging.getLogger(__name__)
+
+# Default number of worker processes
+BATCH_MAX_WORKERS = min(4, os.cpu_count() or 1)
+# Seconds a template can take
+BATCH_JOB_TIMEOUT = 120
+BATCH_MAX_TEMPLATES = 500
+
+ERRORS_FILENAME = 'errors.json'
+
+class _ZipStream(io.RawIOBase):
+    '''
+    Write-only, unseekable file keeping what is written until it is taken
+    '''
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _mp_context():
+    '''
+    Worker processes are not forked from the server, whose threads may hold locks.
+
+    As with spawn, the main module of the program is imported again by path in the new
+    processes, so scripts that generate batches must guard their entry point with
+    if __name__ == '__main__'.
+    '''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # Workers are forked from a process that has already imported this module and create_template
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+def _init_worker(fields_filepath):
+    '''
+    Load the field registry once in each worker process, rather than for each template
+    '''
+    if fields_filepath is None:
+        return
+    try:
+        get_field_registry(fields_filepath)
+    except FileNotFoundError as e:
+        # Loaded by the first template that needs it, once the catalogues are pulled
+        logger.warning(f"Field catalogues not loaded in the worker: {e}")
+
+class BatchPool(object):
+    '''
+    Long-lived pool of worker processes generating the templates of batches
+
+    The processes are started with the first batch and kept for the next ones.
+    If a worker dies, e.g. killed for using too much memory, the pool is replaced.
+
+    Parameters
+    ----------
+    max_workers: int
+        Maximum number of worker processes
+    fields_filepath: string
+        Directory holding the field catalogues, loaded when each worker starts
+    '''
+
+    def __init__(self, max_workers=BATCH_MAX_WORKERS, fields_filepath=None):
+        self.max_workers = max(1, max_workers)
+        self.fields_filepath = fields_filepath
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=_mp_context(),
+                    initializer=_init_worker,
+                    initargs=(self.fields_filepath,)
+                )
+            return self._executor
+
+    def _replace(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args):
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Worker pool broken, starting a new one")
+            self._replace(executor)
+            return self._get_executor().submit(fn, *args)
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def _job_timeout(signum, frame):
+    raise TimeoutError('The template took too long to generate')
+
+def generate_workbook(template_args, timeout=None):
+    '''
+    Write a template and return its content. Run in the worker processes.
+
+    Parameters
+    ----------
+    template_args: dictionary
+        Keyword arguments of create_template, apart from the output file
+    timeout: float
+        Seconds after which the template is abandoned, no limit if None.
+        Only enforced where SIGALRM is available.
+
+    Returns
+    -------
+    workbook: bytes
+    '''
+    alarm = timeout is not None and hasattr(signal, 'SIGALRM')
+    if alarm:
+        signal.signal(signal.SIGALRM, _job_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        workbook = io.BytesIO()
+        create_template(workbook, **template_args)
+        return workbook.getvalue()
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def unique_filenames(filenames):
+    '''
+    File names made unique within a zip, by numbering repeated names, e.g. template_2.xlsx
+    '''
+    seen = set()
+    unique = []
+    for filename in filenames:
+        stem, extension = os.path.splitext(filename)
+        candidate = filename
+        number = 1
+        while candidate in seen:
+            number += 1
+            candidate = f'{stem}_{number}{extension}'
+        seen.add(candidate)
+        unique.append(candidate)
+    return unique
+
+def iter_batch_zip(jobs, pool, timeout=BATCH_JOB_TIMEOUT, workbook_cache=None):
+    '''
+    Generate templates in a pool of processes, yielding a zip of the workbooks as they complete
+
+    Parameters
+    ----------
+    jobs: list of tuples
+        File name in the zip and keyword arguments of create_template of each template
+    pool: BatchPool
+        Worker processes generating the templates
+    timeout: float
+        Seconds each template can take, no limit if None
+    workbook_cache: WorkbookCache
+        Workbooks already generated are taken from it rather than generated again, and new ones are added to it
+
+    Yields
+    ------
+    chunk: bytes
+        Next part of the zip
+    '''
+    stream = _ZipStream()
+    errors = {}
+
+    cached = []
+    pending = []
+    for filename, template_args in jobs:
+        key = workbook_key(template_args) if workbook_cache is not None else None
+        workbook = workbook_cache.get(key) if key is not None else None
+        if workbook is not None:
+            cached.append((filename, workbook))
+        else:
+            pending.append((filename, key, template_args))
+
+    futures = {}
+    try:
+        for filename, key, template_args in pending:
+            futures[pool.submit(generate_workbook, template_args, timeout)] = (filename, key)
+        # Workbooks are already compressed
+        with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for filename, workbook in cached:
+                zf.writestr(filename, workbook)
+                yield stream.take()
+            for future in as_completed(futures):
+                filename, key = futures[future]
+                try:
+                    workbook = future.result()
+                except Exception as e:
+                    logger.exception(f"Could not generate {filename}: {e}")
+                    errors[filename] = f'{type(e).__name__}: {e}'
+                    continue
+                if key is not None:
+                    workbook_cache.set(key, workbook)
+                zf.writestr(filename, workbook)
+                yield stream.take()
+            if errors:
+                zf.writestr(ERRORS_FILENAME, json.dumps(errors, indent=2))
+        yield stream.take()
+    finally:
+        # Also reached when the client goes away before the end of the batch.
+        # The templates not started yet are dropped, the pool is kept for the next batches.
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by the in-process caches of the template generator
+"""
+
+import hashlib
+import os
+
+def files_signature(filepaths):
+    '''
+    Cheap fingerprint of a group of files, used to tell if cached data is stale.
+    Missing files are recorded too, so creating them later invalidates the cache.
+
+    Parameters
+    ----------
+    filepaths: list of strings
+        Files that the cached data was built from
+
+    Returns
+    -------
+    signature: tuple
+        (filepath, modification time, size) for each file
+    '''
+    signature = []
+    for filepath in filepaths:
+        try:
+            stat = os.stat(filepath)
+            signature.append((filepath, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((filepath, None, None))
+    return tuple(signature)
+
+def signature_version(signature):
+    '''
+    Short version string for a signature returned by files_signature
+    '''
+    return hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reading the field catalogues, either from the source files in the fields
+directory (JSON and CSV) or from the compiled catalogue.
+
+The compiled catalogue is a versioned pickle written by update-config.py and
+after pulling terms from /update. It holds the catalogues in their final shape,
+so it loads much faster than decoding the JSON files. It is only used when it
+was compiled from the source files currently on disk; otherwise the source
+files are read.
+
+The compiled catalogue is written and read by the application itself.
+Do not load a compiled catalogue from an untrusted source.
+"""
+
+import logging
+import os
+import pickle
+from .cache_utils import files_signature
+from .pull_cf_standard_names import cf_standard_names_to_dic
+from .pull_other_fields import other_fields_to_dic
+from .pull_darwin_core_terms import dwc_terms_to_dic, Darwin_Core_Extension, extensions
+from .pull_global_attributes import global_attributes_to_df
+
+logger = logging.getLogger(__name__)
+
+COMPILED_CATALOGUE_FILE = 'compiled_catalogue.pickle'
+
+# Increase when the content of the compiled catalogue changes
+COMPILED_CATALOGUE_FORMAT = 2
+
+CATALOGUE_FILES = [
+    'other_fields.json',
+    'cf_standard_names.json',
+    'dwc_terms.json',
+    'global_attributes.csv'
+]
+
+# Several cores and extensions share a file, e.g. 'Occurrence Core' and 'Occurrence Extension'
+DWC_EXTENSION_FILES = sorted(set(vals['file'] for vals in extensions.values()))
+
+def catalogue_signature(fields_filepath):
+    '''
+    Signature of the catalogue source files in the fields directory
+    '''
+    filenames = CATALOGUE_FILES + DWC_EXTENSION_FILES
+    return files_signature([os.path.join(fields_filepath, filename) for filename in filenames])
+
+def _sources(signature):
+    # Compared without the directory, so that the fields directory can be moved
+    return tuple((os.path.basename(filepath), mtime, size) for filepath, mtime, size in signature)
+
+def read_dwc_extension(fields_filepath, filename):
+    '''
+    Read the terms and description of a Darwin Core core or extension from its JSON file.
+    Only the attributes of the terms used by the app are kept.
+    '''
+    dwc_extension = Darwin_Core_Extension(filename, os.path.join(fields_filepath, filename))
+    dwc_extension.load_json(projected=True)
+    return {
+        'terms': dwc_extension.dic,
+        'description': dwc_extension.description
+    }
+
+def read_catalogues(fields_filepath):
+    '''
+    Read the catalogues from the source files
+
+    Returns
+    -------
+    catalogues: dictionary
+        other_fields, cf_standard_names and dwc_terms as lists of dictionaries,
+        global_attributes as columns and rows.
+        Only the attributes of the CF standard names and Darwin Core terms used by the app are kept.
+        dwc_extensions is None, the extensions are read from their files when needed.
+    '''
+    df_global_attributes = global_attributes_to_df(fields_filepath)
+    return {
+        'other_fields': other_fields_to_dic(fields_filepath),
+        'cf_standard_names': cf_standard_names_to_dic(fields_filepath, projected=True),
+        'dwc_terms': dwc_terms_to_dic(fields_filepath, projected=True),
+        'global_attributes': {
+            'columns': list(df_global_attributes.columns),
+            'rows': df_global_attributes.values.tolist()
+        },
+        'dwc_extensions': None,
+        'dwc_extension_descriptions': None
+    }
+
+def compile_catalogues(fields_filepath):
+    '''
+    Write the compiled catalogue from the source files in the fields directory
+
+    Parameters
+    ----------
+    fields_filepath: string
+        Directory holding the field catalogues
+
+    Returns
+    -------
+    filepath: string
+        Path of the compiled catalogue
+    '''
+    signature = catalogue_signature(fields_filepath)
+    catalogues = read_catalogues(fields_filepath)
+
+    # Extensions are pickled separately so that only those in use are unpickled
+    catalogues['dwc_extensions'] = {}
+    catalogues['dwc_extension_descriptions'] = {}
+    for filename in DWC_EXTENSION_FILES:
+        dwc_extension = read_dwc_extension(fields_filepath, filename)
+        catalogues['dwc_extensions'][filename] = pickle.dumps(dwc_extension, protocol=pickle.HIGHEST_PROTOCOL)
+        catalogues['dwc_extension_descriptions'][filename] = dwc_extension['description']
+
+    catalogues['format'] = COMPILED_CATALOGUE_FORMAT
+    catalogues['sources'] = _sources(signature)
+
+    filepath = os.path.join(fields_filepath, COMPILED_CATALOGUE_FILE)
+    tmp_filepath = filepath + '.tmp'
+    with open(tmp_filepath, 'wb') as f:
+        pickle.dump(catalogues, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filepath, filepath)
+
+    return filepath
+
+def load_compiled_catalogues(fields_filepath, signature):
+    '''
+    Load the compiled catalogue
+
+    Parameters
+    ----------
+    fields_filepath: string
+        Directory holding the field catalogues
+    signature: tuple
+        Current signature of the source files, from catalogue_signature
+
+    Returns
+    -------
+    catalogues: dictionary
+        Same content as read_catalogues, with the extensions included.
+        None if the compiled catalogue is missing, from another format or stale.
+    '''
+    filepath = os.path.join(fields_filepath, COMPILED_CATALOGUE_FILE)
+    if not os.path.isfile(filepath):
+        return None
+    try:
+        with open(filepath, 'rb') as f:
+            catalogues = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Could not load compiled catalogue {filepath}: {e}")
+        return None
+    if catalogues.get('format') != COMPILED_CATALOGUE_FORMAT:
+        return None
+    if catalogues.get('sources') != _sources(signature):
+        return None
+    return catalogues
+
+def load_catalogues(fields_filepath, signature):
+    '''
+    Load the catalogues from the compiled catalogue if it is up to date, otherwise from the source files
+    '''
+    catalogues = load_compiled_catalogues(fields_filepath, signature)
+    if catalogues is None:
+        catalogues = read_catalogues(fields_filepath)
+    return catalogues
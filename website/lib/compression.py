@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compression and caching of responses, for clients on slow links
+
+- Pages and JSON responses are compressed with brotli or gzip, as accepted by the client.
+  brotli is optional: gzip is used if the brotli package is not installed.
+- Static files are served from their pre-compressed variants (e.g. bootstrap.min.css.gz),
+  written by `make compress-static`, when the variants are up to date.
+- URLs of static files carry a fingerprint of the file content (?v=...). Fingerprinted
+  files are cached by browsers for a year, and a changed file gets a new URL.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content types worth compressing. Workbooks and images are already compressed.
+COMPRESSIBLE_MIMETYPES = [
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml'
+]
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 500
+GZIP_LEVEL = 6
+# Quality 11 is for pre-compressed files, it is too slow for responses
+BROTLI_QUALITY = 5
+
+# Extensions of the pre-compressed variants of static files, by encoding
+PRECOMPRESSED_EXTENSIONS = {
+    'br': '.br',
+    'gzip': '.gz'
+}
+
+STATIC_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+def available_encodings():
+    '''
+    Encodings the server can compress with, in order of preference
+    '''
+    if brotli is not None:
+        return ['br', 'gzip']
+    return ['gzip']
+
+def accepted_encoding(encodings=None):
+    '''
+    Preferred encoding of the current request among those given, or None for no compression
+    '''
+    if encodings is None:
+        encodings = available_encodings()
+    encodings = [encoding for encoding in encodings if request.accept_encodings[encoding] > 0]
+    if not encodings:
+        return None
+    return request.accept_encodings.best_match(encodings)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def encoded_etag(etag, encoding):
+    '''
+    ETag of a compressed representation. Each encoding has its own strong ETag.
+    '''
+    return f'{etag}-{encoding}'
+
+def etag_variants(etag):
+    '''
+    The ETag and those of its compressed representations, to compare with If-None-Match
+    '''
+    return [etag] + [encoded_etag(etag, encoding) for encoding in PRECOMPRESSED_EXTENSIONS]
+
+def compress_response(response):
+    '''
+    Compress a response if the client accepts it and it is worth it
+    '''
+    response.vary.add('Accept-Encoding')
+
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+# Fingerprints of static files: (filepath, mtime, size) -> fingerprint
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+def static_fingerprint(filepath):
+    '''
+    Short hash of the content of a static file, None if the file does not exist
+    '''
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    key = (filepath, stat.st_mtime_ns, stat.st_size)
+    fingerprint = _fingerprints.get(key)
+    if fingerprint is None:
+        with open(filepath, 'rb') as f:
+            fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+        with _fingerprints_lock:
+            _fingerprints[key] = fingerprint
+    return fingerprint
+
+def static_signature(static_folder):
+    '''
+    Fingerprints of all the static files, which the URLs in the pages carry.
+    Pre-compressed variants are left out, they have the fingerprint of their file.
+    '''
+    signature = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(tuple(PRECOMPRESSED_EXTENSIONS.values())):
+                continue
+            filepath = os.path.join(dirpath, filename)
+            signature.append((os.path.relpath(filepath, static_folder), static_fingerprint(filepath)))
+    return tuple(signature)
+
+def _precompressed_variant(static_folder, filename):
+    '''
+    Encoding and file name of the up to date pre-compressed variant of a static file accepted by the client
+    '''
+    filepath = os.path.join(static_folder, filename)
+    try:
+        mtime = os.stat(filepath).st_mtime_ns
+    except OSError:
+        return None, None
+    for encoding in PRECOMPRESSED_EXTENSIONS:
+        if request.accept_encodings[encoding] <= 0:
+            continue
+        variant = filename + PRECOMPRESSED_EXTENSIONS[encoding]
+        try:
+            if os.stat(os.path.join(static_folder, variant)).st_mtime_ns >= mtime:
+                return encoding, variant
+        except OSError:
+            continue
+    return None, None
+
+def init_compression(app):
+    '''
+    Register the compression of responses, the pre-compressed and fingerprinted static files with the app
+    '''
+    static_folder = app.static_folder
+
+    def static(filename):
+        encoding, variant = _precompressed_variant(static_folder, filename)
+        if encoding is None:
+            response = send_from_directory(static_folder, filename)
+        else:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            # The ETag is that of the variant file, so it differs from the uncompressed file
+            response = send_from_directory(static_folder, variant, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        # Only the current fingerprint is cached for good, a stale one could be another content
+        fingerprint = request.args.get('v')
+        if fingerprint and fingerprint == static_fingerprint(os.path.join(static_folder, filename)):
+            response.headers['Cache-Control'] = STATIC_CACHE_CONTROL
+        return response
+
+    app.view_functions['static'] = static
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            fingerprint = static_fingerprint(os.path.join(static_folder, values['filename']))
+            if fingerprint is not None:
+                values['v'] = fingerprint
+
+    app.after_request(compress_response)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Configuration model for template_configurations.yaml
+
+The YAML file is parsed once and reloaded only when it changes on disk.
+The parsed setups are shared between requests, so they must not be modified.
+"""
+
+import threading
+import yaml
+from .cache_utils import files_signature, signature_version
+from website import CONFIG_PATH
+
+# The C-accelerated loader is only available when PyYAML is built against libyaml
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+REQUIREMENTS = ['Required', 'Recommended', 'Suggested']
+FROM_SOURCE = 'from source'
+
+class SheetRequirements(object):
+    """
+    Fields required, recommended and suggested for one sheet of a configuration
+    """
+
+    def __init__(self, criteria):
+        """
+        Parameters
+        ----------
+        criteria: dictionary
+            The first item of the 'fields' list of the sheet in the YAML file.
+            Each requirement is either a list of fields or 'from source',
+            meaning all the terms of the Darwin Core core or extension.
+        """
+        self.criteria = criteria
+        self.fields = {}
+        self.from_source = set()
+        for requirement in REQUIREMENTS:
+            value = criteria.get(requirement, [])
+            if value == FROM_SOURCE:
+                self.from_source.add(requirement)
+                value = []
+            self.fields[requirement] = tuple(value)
+        self.from_source = frozenset(self.from_source)
+
+        self.required = frozenset(self.fields['Required'])
+        self.recommended = frozenset(self.fields['Recommended'])
+        self.suggested = frozenset(self.fields['Suggested'])
+
+class ConfigurationModel(object):
+    """
+    Typed view of template_configurations.yaml
+    """
+
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.signature = files_signature([config_path])
+        self.version = signature_version(self.signature)
+
+        with open(config_path, encoding='utf-8') as f:
+            self.setups = yaml.load(f, Loader=SafeLoader)['setups']
+
+        self.configs = tuple(self.setups.keys())
+        self.subconfigs = {}
+        for config, setup in self.setups.items():
+            # Configurations without their own fields are split into subconfigurations
+            if 'fields' in setup:
+                self.subconfigs[config] = ()
+            else:
+                self.subconfigs[config] = tuple(setup.keys())
+
+        self._requirements = {}
+
+    def is_stale(self):
+        return files_signature([self.config_path]) != self.signature
+
+    def get_config_dict(self, config, subconfig=None):
+        '''
+        The setup of a configuration, or of a subconfiguration if given
+        '''
+        if subconfig:
+            return self.setups[config][subconfig]
+        else:
+            return self.setups[config]
+
+    def get_sheet_requirements(self, config, subconfig, sheetname):
+        '''
+        Requirements for a sheet of a configuration
+
+        Parameters
+        ----------
+        config: string
+            'Darwin Core', 'CF-NetCDF', or 'Nansen Legacy logging system'
+        subconfig: string
+            Subconfiguration, or None if the configuration has none
+        sheetname: string
+            Name of the sheet. Only used for Darwin Core, where each sheet is a core or extension.
+
+        Returns
+        -------
+        requirements: SheetRequirements
+        '''
+        key = (config, subconfig, sheetname)
+        if key not in self._requirements:
+            config_dict = self.get_config_dict(config, subconfig)
+            if 'fields' in config_dict:
+                criteria = config_dict['fields'][0]
+            else:
+                criteria = config_dict[sheetname]['fields'][0]
+            self._requirements[key] = SheetRequirements(criteria)
+        return self._requirements[key]
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_config_model(config_path=CONFIG_PATH):
+    '''
+    Get the configuration model, parsing the YAML file if it is not loaded or has changed
+    '''
+    model = _models.get(config_path)
+    if model is None or model.is_stale():
+        with _models_lock:
+            model = _models.get(config_path)
+            if model is None or model.is_stale():
+                model = ConfigurationModel(config_path)
+                _models[config_path] = model
+    return model
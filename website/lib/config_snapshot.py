@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Resolved configurations, cached per (config, subconfig)
+
+Resolving a configuration only depends on the configuration, the subconfiguration
+and the versions of the field registry and template_configurations.yaml.
+A snapshot is built once and reused until one of those versions changes.
+Snapshots are shared between requests, so requests must work on the
+copies returned by ConfigSnapshot.get_output_config_dict rather than modifying them.
+"""
+
+import threading
+from types import MappingProxyType
+from .cache_utils import signature_version
+from .field_registry import get_field_registry
+from .config_model import get_config_model
+from .get_configurations import get_config_fields
+
+CF_NETCDF_DESCRIPTION = 'Template for data and metadata to be encoded in a CF-NetCDF file'
+
+class ConfigSnapshot(object):
+    """
+    Fully resolved fields of a (config, subconfig) combination
+    """
+
+    def __init__(self, fields_filepath, config, subconfig, versions):
+        self.fields_filepath = fields_filepath
+        self.config = config
+        self.subconfig = subconfig
+        self.versions = versions
+
+        (
+            output_config_dict,
+            fields_in_config_list,
+            extra_fields_dict,
+            cf_standard_names,
+            groups,
+            dwc_terms
+        ) = get_config_fields(fields_filepath=fields_filepath, config=config, subconfig=subconfig)
+
+        registry = get_field_registry(fields_filepath)
+
+        # Fields already have their drop-down lists, attached when the field registry was built
+        sheets_descriptions = {}
+        for sheet in output_config_dict.keys():
+            if config == 'Darwin Core':
+                sheets_descriptions[sheet] = registry.get_dwc_extension_description(sheet)
+            elif config == 'CF-NetCDF':
+                sheets_descriptions[sheet] = CF_NETCDF_DESCRIPTION
+            else:
+                sheets_descriptions[sheet] = None
+
+        # Darwin Core terms that can be added to each sheet, leaving out those already in its requirements
+        dwc_terms_by_sheet = {}
+        dwc_term_ids_by_sheet = {}
+        for sheet, criteria in output_config_dict.items():
+            fields_accounted_for = set()
+            for key, fields in criteria.items():
+                if key not in ['Required CSV', 'Source']:
+                    fields_accounted_for.update(fields.keys())
+            dwc_terms_by_sheet[sheet] = tuple(term for term in dwc_terms if term['id'] not in fields_accounted_for)
+            dwc_term_ids_by_sheet[sheet] = frozenset(term['id'] for term in dwc_terms_by_sheet[sheet])
+
+        self.output_config_dict = output_config_dict
+        self.fields_in_config_list = tuple(fields_in_config_list)
+        self.extra_fields_dict = MappingProxyType(extra_fields_dict)
+        self.cf_standard_names = tuple(cf_standard_names)
+        self.groups = tuple(groups)
+        self.dwc_terms = tuple(dwc_terms)
+        # Positions by id, to look up selected fields and keep them in the order of the catalogues
+        self.cf_standard_name_positions = MappingProxyType({field['id']: idx for idx, field in enumerate(self.cf_standard_names)})
+        self.dwc_term_positions = MappingProxyType({term['id']: idx for idx, term in enumerate(self.dwc_terms)})
+        self.dwc_terms_by_sheet = MappingProxyType(dwc_terms_by_sheet)
+        self.dwc_term_ids_by_sheet = MappingProxyType(dwc_term_ids_by_sheet)
+
+        # Keys of the term lists of the term pickers, by catalogue and sheet.
+        # Sheets that can pick from the same terms share a key, so pages of terms are cached by key rather than by sheet.
+        cf_term_list_key = signature_version((versions, tuple(field['id'] for field in self.cf_standard_names)))
+        dwc_term_list_keys = {}
+        for sheet, terms in dwc_terms_by_sheet.items():
+            dwc_term_list_keys[sheet] = signature_version((versions, tuple(term['id'] for term in terms)))
+        self.term_list_keys = MappingProxyType({
+            'cf': MappingProxyType({sheet: cf_term_list_key for sheet in output_config_dict}),
+            'dwc': MappingProxyType(dwc_term_list_keys),
+            'other': MappingProxyType({sheet: signature_version((versions, tuple(self.extra_fields_dict))) for sheet in output_config_dict})
+        })
+        self.sheets_descriptions = MappingProxyType(sheets_descriptions)
+
+    def get_output_config_dict(self):
+        '''
+        Copy of the output configuration dictionary that a request can modify.
+        Sheets and requirement dictionaries are copied, the field dictionaries are shared.
+        To change a field, replace it with a copy, e.g. dict(field, checked='yes')
+        '''
+        output_config_dict = {}
+        for sheet, criteria in self.output_config_dict.items():
+            output_config_dict[sheet] = {}
+            for key, value in criteria.items():
+                if key in ['Required CSV', 'Source']:
+                    output_config_dict[sheet][key] = value
+                else:
+                    output_config_dict[sheet][key] = dict(value)
+        return output_config_dict
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+def get_config_snapshot(fields_filepath, config, subconfig=None):
+    '''
+    Get the resolved configuration, building it if it is missing or out of date
+
+    Parameters
+    ----------
+    fields_filepath: string
+        Directory holding the field catalogues
+    config: string
+        'Darwin Core', 'CF-NetCDF', or 'Nansen Legacy logging system'
+    subconfig: string
+        Subconfiguration, or None if the configuration has none
+
+    Returns
+    -------
+    snapshot: ConfigSnapshot
+    '''
+    versions = (
+        get_field_registry(fields_filepath).version,
+        get_config_model().version
+    )
+    key = (fields_filepath, config, subconfig)
+    snapshot = _snapshots.get(key)
+    if snapshot is None or snapshot.versions != versions:
+        with _snapshots_lock:
+            snapshot = _snapshots.get(key)
+            if snapshot is None or snapshot.versions != versions:
+                snapshot = ConfigSnapshot(fields_filepath, config, subconfig, versions)
+                _snapshots[key] = snapshot
+    return snapshot
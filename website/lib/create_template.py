@@ -9,10 +9,14 @@ Based on https://github.com/SIOS-Svalbard/darwinsheet/blob/master/scripts/make_x
 '''
 
 import xlsxwriter
+import xlsxwriter.utility
 import math
+import csv
+import json
 from argparse import Namespace
+from itertools import tee, zip_longest
 from .get_configurations import get_field_requirements
-from .pull_global_attributes import global_attributes_to_df
+from .field_registry import get_field_registry
 import os
 import sys
 from pathlib import Path
@@ -26,6 +30,37 @@ from process_cf_attributes import CF_Attributes
 DEFAULT_FONT = 'Calibri'
 DEFAULT_SIZE = 10
 
+# Final row of the data sheets to extend formatting and cell restrictions to, unless set per template
+DEFAULT_END_ROW = 20000
+
+# Fills the shorter columns of prefilled data when they are written row by row
+_NO_VALUE = object()
+
+def clean_column_data(data):
+    """Values of a column of prefilled data, with 'NULL' and NaN values left empty."""
+    for x in data:
+        yield '' if x == 'NULL' or (isinstance(x, float) and math.isnan(x)) else x
+
+def column_from_file(filepath, column=None):
+    """
+    Values of a column of prefilled data, read lazily from a file so that they are never all in memory.
+    For use as the 'data' of a field, e.g. station names or sample IDs from an earlier leg.
+
+    Parameters
+    ----------
+    filepath: string
+        Text file with one value per line, or CSV file with a header row if column is given
+    column: string
+        Column of the CSV file to read
+    """
+    with open(filepath, newline='') as f:
+        if column is None:
+            for line in f:
+                yield line.rstrip('\r\n')
+        else:
+            for row in csv.DictReader(f):
+                yield row[column]
+
 def add_line_breaks(text, n):
     """Add line breaks to a long string every n characters or fewer if n characters falls within a word."""
     lines = []
@@ -45,13 +80,25 @@ class Template(object):
     Spreadsheet template object
     """
 
-    def __init__(self, filepath, fields_filepath, config, subconfig):
+    def __init__(self, filepath, fields_filepath, config, subconfig, streaming=False):
         self.filepath = filepath
         self.config = config
         self.subconfig = subconfig
-        self.workbook = xlsxwriter.Workbook(self.filepath)
+        self.streaming = streaming
+        if streaming:
+            # Each row is written to a temporary file once the next row is started, so memory use
+            # does not grow with the amount of prefilled data. Rows must be written in increasing order.
+            self.workbook = xlsxwriter.Workbook(self.filepath, {'constant_memory': True})
+        elif isinstance(filepath, (str, os.PathLike)):
+            self.workbook = xlsxwriter.Workbook(self.filepath)
+        else:
+            # Writable buffer, e.g. io.BytesIO. The workbook is assembled in memory, without temporary files.
+            self.workbook = xlsxwriter.Workbook(self.filepath, {'in_memory': True})
         self.fields_filepath = fields_filepath
 
+        # Cell formats of the columns, by their properties
+        self._formats = {}
+
         # Set font
         self.workbook.formats[0].set_font_name(DEFAULT_FONT)
         self.workbook.formats[0].set_font_size(DEFAULT_SIZE)
@@ -182,6 +229,30 @@ class Template(object):
             'font_size': DEFAULT_SIZE,
             })
 
+    def get_format(self, properties):
+        '''
+        Cell format with the given properties and the default font, created once and shared by
+        all the columns with the same properties. The properties are not modified.
+
+        Parameters
+        ----------
+        properties: dictionary
+            Format properties, e.g. the 'cell_format' of a field
+
+        Returns
+        -------
+        cell_format: xlsxwriter.format.Format
+        '''
+        properties = dict(properties)
+        properties.setdefault('font_name', DEFAULT_FONT)
+        properties.setdefault('font_size', DEFAULT_SIZE)
+        key = json.dumps(properties, sort_keys=True, default=str)
+        cell_format = self._formats.get(key)
+        if cell_format is None:
+            cell_format = self.workbook.add_format(properties)
+            self._formats[key] = cell_format
+        return cell_format
+
     def add_global_attributes(self):
         global_attributes = Global_Attributes_Sheet(self)
         global_attributes.add_global_attributes()
@@ -193,10 +264,10 @@ class Template(object):
         variable_attributes = Variable_Attributes_Sheet(sheetname, content, self)
         variable_attributes.add_variable_attributes()
 
-    def add_data_sheet(self, sheetname, sheet_info, content, split_personnel_columns):
+    def add_data_sheet(self, sheetname, sheet_info, content, split_personnel_columns, end_row=DEFAULT_END_ROW):
         data_sheet = Data_Sheet(sheetname, sheet_info, content, self)
         data_sheet.write_key()
-        data_sheet.write_columns(split_personnel_columns)
+        data_sheet.write_columns(split_personnel_columns, end_row)
 
     def add_conversions(self):
         Conversions_Sheet(self)
@@ -205,6 +276,8 @@ class Template(object):
         Readme_Sheet(self)
 
     def close_and_save(self):
+        if hasattr(self, 'variables_sheet'):
+            self.variables_sheet.write_lists()
         self.workbook.close()
 
 class Data_Sheet(object):
@@ -227,6 +300,9 @@ class Data_Sheet(object):
 
         paste_message = "Use 'paste special' / 'paste only' so not to overwrite cell restrictions"
 
+        # Set height of row
+        self.sheet.set_row(0, height=24)
+
         # Key
         if self.template.config == 'Nansen Legacy logging system':
             self.title_row = 10  # starting row
@@ -257,13 +333,23 @@ class Data_Sheet(object):
             self.sheet.merge_range('A9:G9', f'{self.sheetname}: {self.sheet_description}', self.template.sheet_description_format)
             self.sheet.merge_range('A10:G10', self.sheet_source, self.template.sheet_description_format)
 
-    def write_columns(self, split_personnel_columns):
+    def write_columns(self, split_personnel_columns, end_row=DEFAULT_END_ROW):
         '''
         Writing one column for each field
+
+        Parameters
+        ----------
+        split_personnel_columns: boolean
+            Option to split personnel columns into multiple columns
+        end_row: int
+            Final row to extend formatting and cell restrictions to
         '''
         start_row = self.title_row + 2
         parameter_row = self.title_row + 1  # Parameter row, hidden
-        end_row = 20000  # final row to extend formatting and cell restrictions to
+        end_row = max(end_row, start_row)
+
+        # Cell restrictions by column, written once all columns are known so that identical ones are merged
+        validations = []
 
         (
         required_fields,
@@ -312,6 +398,10 @@ class Data_Sheet(object):
             if field not in fields_order:
                 sorted_dict[field] = vals
 
+        # Columns are collected first and then written row by row, as rows must be written in increasing order in streaming mode.
+        # Each column has its title, title format, parameter name, prefilled data and cell format.
+        columns = []
+
         # Loop over all the variables/columns needed
         ii = 0
 
@@ -327,8 +417,13 @@ class Data_Sheet(object):
                     elif duplication == 1:
                         name = 'Maximum ' + field
 
-                    self.sheet.write(self.title_row, ii, name, self.template.bounds_format) # Write title row
-                    self.sheet.write(parameter_row, ii, name.replace(' ', '_')) # Write title row
+                    columns.append({
+                        'title': name,
+                        'title_format': self.template.bounds_format,
+                        'parameter': name.replace(' ', '_'),
+                        'data': None,
+                        'cell_format': None
+                    })
 
                     valid = {
                         'validate': 'decimal',
@@ -339,13 +434,7 @@ class Data_Sheet(object):
                     valid['input_message'] = add_line_breaks('For use when a data point does not represent a single point in space or time, but a cell of finite size. Use this variable to encode the extent of the cell (e.g. the minimum and maximum depth that a data point is representative of).', 35)
                     valid['input_message'].replace('\n', '\n\r')
 
-                    self.sheet.data_validation(
-                        first_row=start_row,
-                        first_col=ii,
-                        last_row=end_row,
-                        last_col=ii,
-                        options=valid
-                        )
+                    validations.append((ii, valid))
 
                     ii = ii + 1
                     duplication = duplication - 1
@@ -356,27 +445,34 @@ class Data_Sheet(object):
                 else:
                     duplication = 1
 
+                # Optional data to prefill the column(s) with, from a list, an iterator or a file.
+                # Duplicated columns each get their own copy of the values.
+                if 'data' in vals.keys():
+                    data_copies = tee(clean_column_data(vals['data']), duplication)
+                else:
+                    data_copies = [None] * duplication
+
                 while duplication > 0:
 
-                    # Write title row
+                    # Title row
                     if self.template.config == 'Nansen Legacy logging system' and field in ['recordedBy', 'pi_details'] and duplication == 3:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.required_field_format)
+                        title_format = self.template.required_field_format
                     elif field in required_fields:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.required_field_format)
+                        title_format = self.template.required_field_format
                     elif field in recommended_fields:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.recommended_field_format)
+                        title_format = self.template.recommended_field_format
                     elif field in cf_standard_names:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.cf_field_format)
+                        title_format = self.template.cf_field_format
                     elif field in dwc_terms:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.dwc_term_format)
+                        title_format = self.template.dwc_term_format
                     else:
-                        self.sheet.write(self.title_row, ii, vals['disp_name'], self.template.optional_field_format)
+                        title_format = self.template.optional_field_format
 
-                    # Write row below with parameter name
+                    # Row below with parameter name
                     if field in ['recordedBy', 'pi_details'] and split_personnel_columns == True:
-                        self.sheet.write(parameter_row, ii, field+ '_' + str(3-duplication))
+                        parameter = field+ '_' + str(3-duplication)
                     else:
-                        self.sheet.write(parameter_row, ii, field)
+                        parameter = field
 
                     # Write validations and cell restrictions
                     if 'valid' in vals:
@@ -411,43 +507,99 @@ class Data_Sheet(object):
                             valid_copy.pop('source', None)
                             valid_copy['value'] = ref
 
-                        self.sheet.data_validation(
-                            first_row=start_row,
-                            first_col=ii,
-                            last_row=end_row,
-                            last_col=ii,
-                            options=valid_copy
-                            )
+                        validations.append((ii, valid_copy))
 
+                    cell_format = None
                     if 'cell_format' in vals:
-                        if 'font_name' not in vals['cell_format']:
-                            vals['cell_format']['font_name'] = DEFAULT_FONT
-                        if 'font_size' not in vals['cell_format']:
-                            vals['cell_format']['font_size'] = DEFAULT_SIZE
-                        cell_format = self.template.workbook.add_format(vals['cell_format'])
+                        cell_format = self.template.get_format(vals['cell_format'])
                         self.sheet.set_column(
                             ii, ii, width=20, cell_format=cell_format)
 
-                    # Add optional data to sheet
-                    if 'data' in vals.keys():
-                        vals['data'] = ['' if x == 'NULL' or (isinstance(x, float) and math.isnan(x)) else x for x in vals['data']]
-                        if 'cell_format' in vals:
-                            self.sheet.write_column(start_row,ii,vals['data'], cell_format)
-                        else:
-                            self.sheet.write_column(start_row,ii,vals['data'])
+                    columns.append({
+                        'title': vals['disp_name'],
+                        'title_format': title_format,
+                        'parameter': parameter,
+                        'data': data_copies[len(data_copies) - duplication],
+                        'cell_format': cell_format
+                    })
 
                     ii = ii + 1
                     duplication = duplication - 1
 
-        # Set height of row
-        self.sheet.set_row(0, height=24)
+        # Title row
+        for col, column in enumerate(columns):
+            self.sheet.write(self.title_row, col, column['title'], column['title_format'])
+
+        # Hide ID row
+        self.sheet.set_row(parameter_row, None, None, {'hidden': True})
+        for col, column in enumerate(columns):
+            self.sheet.write(parameter_row, col, column['parameter'])
+
+        # Prefilled data, one row at a time
+        data_columns = [(col, column) for col, column in enumerate(columns) if column['data'] is not None]
+        if data_columns:
+            rows = zip_longest(*[column['data'] for _, column in data_columns], fillvalue=_NO_VALUE)
+            for row, values in enumerate(rows, start=start_row):
+                for (col, column), value in zip(data_columns, values):
+                    if value is _NO_VALUE:
+                        continue
+                    if column['cell_format'] is not None:
+                        self.sheet.write(row, col, value, column['cell_format'])
+                    else:
+                        self.sheet.write(row, col, value)
+
+        self.write_validations(validations, start_row, end_row)
+
         self.sheet.set_column(0,ii-1,20)
 
         # Freeze the rows at the top
         self.sheet.freeze_panes(start_row, 0)
 
-        # Hide ID row
-        self.sheet.set_row(parameter_row, None, None, {'hidden': True})
+    def write_validations(self, validations, start_row, end_row):
+        '''
+        Writing the cell restrictions, one rule for all the columns with identical options.
+        The input title and message are part of the options, so each column keeps its own prompt.
+        Adjacent columns share one range, e.g. C12:E20000, and other columns are added to the rule as further ranges.
+
+        Parameters
+        ----------
+        validations: list of tuples
+            Column and data validation options of each column with restrictions
+        start_row: int
+            First row of the restrictions
+        end_row: int
+            Final row of the restrictions
+        '''
+        columns_by_rule = {}
+        rules = {}
+        for col, valid in validations:
+            key = json.dumps(valid, sort_keys=True, default=str)
+            rules[key] = valid
+            columns_by_rule.setdefault(key, []).append(col)
+
+        for key, cols in columns_by_rule.items():
+            # Runs of adjacent columns
+            runs = []
+            for col in sorted(cols):
+                if runs and col == runs[-1][1] + 1:
+                    runs[-1][1] = col
+                else:
+                    runs.append([col, col])
+
+            options = rules[key]
+            if len(runs) > 1:
+                options = dict(options, multi_range=' '.join(
+                    xlsxwriter.utility.xl_range(start_row, first_col, end_row, last_col)
+                    for first_col, last_col in runs
+                ))
+
+            self.sheet.data_validation(
+                first_row=start_row,
+                first_col=runs[0][0],
+                last_row=end_row,
+                last_col=runs[0][1],
+                options=options
+                )
 
 class Variable_Attributes_Sheet(object):
     """
@@ -495,45 +647,41 @@ class Variable_Attributes_Sheet(object):
             )
 
         parameter_row = self.header_row + 1  # Parameter row, hidden
-        attribute_row = parameter_row + 1
-        column = 0
 
-        # Adding attributes, one attribute per row
-        for attr in highly_recommended_variable_attributes:
-            self.sheet.write(attribute_row, column, attr, self.template.required_field_format)
-            description = variable_attributes[attr]['Description']
-            self.sheet.write(attribute_row, column+1, description, self.template.required_field_format)
-
-            if attr in ['long_name']:
-                height = 200
-            elif len(description) > 111:
-                height = int(len(description)/3)
-            else:
-                height = 37
-
-            self.sheet.set_row(attribute_row, height)
-
-            attribute_row = attribute_row + 1
+        # One row per attribute, highly recommended attributes first
+        attributes = highly_recommended_variable_attributes + [
+            attr for attr in variable_attributes.keys() if attr not in highly_recommended_variable_attributes
+        ]
 
-        for attr, vals in variable_attributes.items():
-            if attr not in highly_recommended_variable_attributes:
-                self.sheet.write(attribute_row, column, attr, self.template.optional_field_format)
-                description = variable_attributes[attr]['Description']
-                self.sheet.write(attribute_row, column+1, description, self.template.optional_field_format)
-                if len(description) > 111:
-                    height = int(len(description)/3)
-                else:
-                    height = 37
+        # One column per variable, after the attribute and description columns.
+        # The sheet is written row by row, as required in streaming mode.
+        variables = list(self.content.items())
+        column = 2 + len(variables)
 
-                self.sheet.set_row(attribute_row, height)
+        if column > 2:
+            max_column = column-1
+        else:
+            max_column = 2
 
-                attribute_row = attribute_row + 1
+        # Key
+        sheet_description = 'Template for entering variable attributes, metadata that describe each variable'
+        source = "Mostly from the 'Appendix A: Attributes' section of the CF conventions document"
+        self.sheet.merge_range('A2:E2', sheet_description, self.template.sheet_description_format)
+        self.sheet.merge_range('A3:E3', source)
+        self.sheet.merge_range('A5:E5', 'Required attribute (in most cases)', self.template.required_field_format)
+        self.sheet.merge_range('A6:E6', 'Other attributes', self.template.optional_field_format)
 
-        # Loop over all the variables/columns needed to add column headers
-        column = column + 2
+        # Column headers
+        self.sheet.write(self.header_row-1, 0, 'Variable Attribute', self.template.header_format)
+        self.sheet.write(self.header_row-1, 1, 'Description', self.template.header_format)
+        if column > 3:
+            self.sheet.merge_range(self.header_row-1, 2, self.header_row-1, max_column, 'Enter values here', self.template.header_format)
+        elif column > 2:
+            self.sheet.write(self.header_row-1, max_column, 'Enter values here', self.template.header_format)
 
-        for field, vals in self.content.items():
-            # Write row for variable name to be added
+        # Row for variable name to be added
+        if variables:
+            self.sheet.set_row(self.header_row, 80)
             self.sheet.write(self.header_row, 0, 'variable_name',self.template.optional_field_format)
             variable_name_description = '''Name to be assigned to the variable in the NetCDF file.
             Note that this is not a variable attribute, but the name assigned to the variable itself.
@@ -541,58 +689,48 @@ class Variable_Attributes_Sheet(object):
             CF profiles'''
             variable_name_description = ' '.join(line.strip() for line in variable_name_description.splitlines())
             self.sheet.write(self.header_row, 1, variable_name_description,self.template.optional_field_format)
+        for column, (field, vals) in enumerate(variables, start=2):
             if vals['disp_name'] in cf_standard_names:
                 variable_name = ''
             else:
                 variable_name = vals['disp_name']
             self.sheet.write(self.header_row, column, variable_name, self.template.cf_field_format)
-            self.sheet.set_row(self.header_row, 80)
-            # Write row below with parameter name
+            self.sheet.set_column(column, column, width=40)
+
+        # Hide ID row
+        self.sheet.set_row(parameter_row, None, None, {'hidden': True})
+        # Write row below with parameter name
+        for column, (field, vals) in enumerate(variables, start=2):
             self.sheet.write(parameter_row, column, field)
 
-            attribute_row = parameter_row + 1
+        # Adding attributes, one attribute per row, with empty cells for user to enter values
+        for attribute_row, attr in enumerate(attributes, start=parameter_row+1):
+            description = variable_attributes[attr]['Description']
 
-            # Adding empty cells for user to enter values
-            for attr in highly_recommended_variable_attributes:
+            if attr in highly_recommended_variable_attributes:
+                attribute_format = self.template.required_field_format
+            else:
+                attribute_format = self.template.optional_field_format
+
+            if attr in ['long_name']:
+                height = 200
+            elif len(description) > 111:
+                height = int(len(description)/3)
+            else:
+                height = 37
+
+            self.sheet.set_row(attribute_row, height)
+            self.sheet.write(attribute_row, 0, attr, attribute_format)
+            self.sheet.write(attribute_row, 1, description, attribute_format)
+
+            for column, (field, vals) in enumerate(variables, start=2):
                 if attr == 'standard_name' and vals['disp_name'] in cf_standard_names:
                     value = vals['disp_name']
+                elif attr == 'bounds' and field +'_bounds' in self.content.keys():
+                    value = field +'_bounds'
                 else:
                     value = ''
                 self.sheet.write(attribute_row, column, value, self.template.content_format)
-                attribute_row = attribute_row + 1
-            for attr, vals in variable_attributes.items():
-                if attr not in highly_recommended_variable_attributes:
-                    if attr == 'bounds' and field +'_bounds' in self.content.keys():
-                        value = field +'_bounds'
-                    else:
-                        value = ''
-                    self.sheet.write(attribute_row, column, value, self.template.content_format)
-                    attribute_row = attribute_row + 1
-
-            self.sheet.set_column(column, column, width=40)
-
-            column = column + 1
-
-        if column > 2:
-            max_column = column-1
-        else:
-            max_column = 2
-
-        # Column headers
-        self.sheet.write(self.header_row-1, 0, 'Variable Attribute', self.template.header_format)
-        self.sheet.write(self.header_row-1, 1, 'Description', self.template.header_format)
-        if column > 3:
-            self.sheet.merge_range(self.header_row-1, 2, self.header_row-1, max_column, 'Enter values here', self.template.header_format)
-        elif column > 2:
-            self.sheet.write(self.header_row-1, max_column, 'Enter values here', self.template.header_format)
-
-        # Key
-        sheet_description = 'Template for entering variable attributes, metadata that describe each variable'
-        source = "Mostly from the 'Appendix A: Attributes' section of the CF conventions document"
-        self.sheet.merge_range('A2:E2', sheet_description, self.template.sheet_description_format)
-        self.sheet.merge_range('A3:E3', source)
-        self.sheet.merge_range('A5:E5', 'Required attribute (in most cases)', self.template.required_field_format)
-        self.sheet.merge_range('A6:E6', 'Other attributes', self.template.optional_field_format)
 
         self.sheet.set_column(0, 0, width=25)
         self.sheet.set_column(1, 1, width=60)
@@ -600,9 +738,6 @@ class Variable_Attributes_Sheet(object):
         # Freeze the rows at the top
         self.sheet.freeze_panes(self.header_row, 0)
 
-        # Hide ID row
-        self.sheet.set_row(parameter_row, None, None, {'hidden': True})
-
 class Global_Attributes_Sheet(object):
     """
     Global_Attributes sheet object
@@ -618,15 +753,25 @@ class Global_Attributes_Sheet(object):
     def add_global_attributes(self):
 
         global_attributes_filepath = os.path.dirname(self.template.fields_filepath) + '/fields'
-        df_global_attributes = global_attributes_to_df(global_attributes_filepath)
+        df_global_attributes = get_field_registry(global_attributes_filepath).get_global_attributes_df()
         df_global_attributes['Content'] = ''
 
         last_col = len(df_global_attributes.columns)-1
 
+        # Key. The sheet is written row by row, as required in streaming mode.
+        sheet_description = 'Template for entering global attributes, metadata that describe the overall dataset'
+        self.sheet.merge_range('A2:G2', sheet_description, self.template.sheet_description_format)
+        self.sheet.merge_range('A4:B4', 'Required term', self.template.required_field_format)
+        self.sheet.merge_range('A5:B5', 'Recommended term', self.template.recommended_field_format)
+        self.sheet.merge_range('A6:B6', 'Optional term', self.template.optional_field_format)
+        self.sheet.merge_range('A8:B8', 'More attributes can be selected from')
+        self.sheet.merge_range('A9:B9', 'https://wiki.esipfed.org/Attribute_Convention_for_Data_Discovery_1-3')
+
         for ii, col in enumerate(df_global_attributes.columns):
             self.sheet.write(self.header_row, ii, col, self.template.header_format)
+        self.sheet.set_row(self.header_row+1, None, None, {'hidden': True})
+        for ii, col in enumerate(df_global_attributes.columns):
             self.sheet.write(self.header_row+1, ii, col, self.template.blank_format)
-            self.sheet.set_row(self.header_row+1, None, None, {'hidden': True})
 
         for idx, row in df_global_attributes.iterrows():
 
@@ -697,15 +842,6 @@ class Global_Attributes_Sheet(object):
         # Hide requirements column.
         self.sheet.set_column(3, 3, None, None, {'hidden': True})
 
-        # Key
-        sheet_description = 'Template for entering global attributes, metadata that describe the overall dataset'
-        self.sheet.merge_range('A2:G2', sheet_description, self.template.sheet_description_format)
-        self.sheet.merge_range('A4:B4', 'Required term', self.template.required_field_format)
-        self.sheet.merge_range('A5:B5', 'Recommended term', self.template.recommended_field_format)
-        self.sheet.merge_range('A6:B6', 'Optional term', self.template.optional_field_format)
-        self.sheet.merge_range('A8:B8', 'More attributes can be selected from')
-        self.sheet.merge_range('A9:B9', 'https://wiki.esipfed.org/Attribute_Convention_for_Data_Discovery_1-3')
-
         self.sheet.set_column(0, 0, width=20)
         self.sheet.set_column(1, 1, width=60)
         self.sheet.set_column(2, 2, width=60)
@@ -786,6 +922,8 @@ class Variables_Sheet(object):
         self.sheetname = 'Variables'
         self.sheet = template.workbook.add_worksheet(self.sheetname)
         self.current_column = 0
+        # Lists added so far, written row by row when the workbook is saved
+        self.lists = []
         self.sheet.hide()
 
     def add_row(self, variable, parameter_list):
@@ -803,32 +941,47 @@ class Variables_Sheet(object):
             The range of the list in Excel format
         """
 
-        self.sheet.write(0, self.current_column, variable)
         name = 'Table_' + variable.replace(' ', '_').capitalize()
-
-        self.sheet.add_table(
-            1, self.current_column,
-            1 + len(parameter_list), self.current_column,
-            {'name': name,
-                'header_row': 0}
-        )
-
-        for ii, par in enumerate(sorted(parameter_list, key=str.lower)):
-            self.sheet.write(1 + ii, self.current_column, par)
+        self.lists.append((variable, name, sorted(parameter_list, key=str.lower)))
         ref = '=INDIRECT("' + name + '")'
 
         # Increment row such that the next gets a new row
         self.current_column = self.current_column + 1
         return ref
 
+    def write_lists(self):
+        """
+        Writes the lists, one per column, row by row as required in streaming mode
+        """
+        for column, (variable, name, parameters) in enumerate(self.lists):
+            self.sheet.write(0, column, variable)
+            if self.template.streaming:
+                # Tables are not supported in constant_memory mode, so the list is a defined name instead
+                column_letter = xlsxwriter.utility.xl_col_to_name(column)
+                self.template.workbook.define_name(
+                    name, f"=Variables!${column_letter}$2:${column_letter}${2 + len(parameters)}"
+                )
+            else:
+                self.sheet.add_table(
+                    1, column,
+                    1 + len(parameters), column,
+                    {'name': name,
+                        'header_row': 0}
+                )
+
+        for ii in range(max([len(parameters) for _, _, parameters in self.lists], default=0)):
+            for column, (_, _, parameters) in enumerate(self.lists):
+                if ii < len(parameters):
+                    self.sheet.write(1 + ii, column, parameters[ii])
+
 def create_template(filepath, template_fields_dict, sheets_info, fields_filepath, config, subconfig=None, conversions=True, metadata=True, global_attributes_df=None,
-split_personnel_columns=False):
+split_personnel_columns=False, streaming=False, end_row=DEFAULT_END_ROW):
     """
     Method for calling from other python programs
     Parameters
     ----------
-    filepath: string
-        The output file
+    filepath: string or file-like object
+        The output file, or a writable buffer (e.g. io.BytesIO) to write the workbook to in memory
     template_fields_dict : dictionary
         A dictionary of the fields to include in the template. Divided first by sheet. Includes descriptions, formats and validations
     sheets_info: dictionary
@@ -852,19 +1005,30 @@ split_personnel_columns=False):
         Columns included: recordedBy, pi_details
         This is useful if you want to record multiple people in different columns
         Default: False
+    streaming: boolean
+        Option to write the workbook row by row with xlsxwriter's constant_memory mode,
+        so that memory use stays flat however much data is prefilled.
+        The 'data' of a field can then be an iterator, e.g. column_from_file(filepath).
+        Drop-down lists are defined names rather than tables in this mode.
+        Default: False
+    end_row: int
+        Final row of the data sheets to extend formatting and cell restrictions to,
+        e.g. sized to the expected number of samples
+        Default: 20000
     """
 
     args = Namespace()
     args.verbose = 0
-    args.dir = os.path.dirname(filepath)
+    if isinstance(filepath, (str, os.PathLike)):
+        args.dir = os.path.dirname(filepath)
     args.filepath = filepath
 
-    template = Template(args.filepath, fields_filepath, config, subconfig)
+    template = Template(args.filepath, fields_filepath, config, subconfig, streaming)
     template.add_variables_sheet()
     if metadata == True:
         template.add_global_attributes()
     for sheetname, content in template_fields_dict.items():
-        template.add_data_sheet(sheetname, sheets_info[sheetname], content, split_personnel_columns)
+        template.add_data_sheet(sheetname, sheets_info[sheetname], content, split_personnel_columns, end_row)
         if metadata == True and config == 'CF-NetCDF':
             template.add_variable_attributes(sheetname,content)
     if conversions == True:
@@ -1,45 +1,84 @@
-import pandas as pd
+import csv
+import threading
 from website import DROPDOWNS_PATH
+from .cache_utils import files_signature
 import os
 
+FIELDS_WITH_DROPDOWN_LIST = [
+    'kingdom',
+    'sex',
+    'sampleType',
+    'gearType',
+    'intendedMethod',
+    'filter',
+    'storageTemperature'
+]
+
+# Values of each drop-down list, by CSV file: (signature, values)
+_dropdown_lists = {}
+_dropdown_lists_lock = threading.Lock()
+
+def get_dropdown_list_filepath(field):
+    return os.path.join(DROPDOWNS_PATH, f'{field}.csv')
+
 def get_dropdown_list_from_csv(field):
-    filepath = os.path.join(DROPDOWNS_PATH, f'{field}.csv')
-    df = pd.read_csv(filepath)
-    dropdown_list = list(df[field])
-    return dropdown_list
-
-def populate_dropdown_lists(fields_dict, config):
-
-    fields_with_dropdown_list = [
-        'kingdom',
-        'sex',
-        'sampleType',
-        'gearType',
-        'intendedMethod',
-        'filter',
-        'storageTemperature'
-    ]
-
-    if config == 'Nansen Legacy logging system':
-        fields_with_dropdown_list + [
-            'storageTemp',
-            'filter'
-        ]
-
-    if isinstance(fields_dict, list):
-        fields_with_dropdowns = []
-        for field in fields_dict:
-            if field['id'] in fields_with_dropdown_list:
-                field['valid']['validate'] = 'list'
-                field['valid']['source'] = get_dropdown_list_from_csv(field['id'])
-                field['valid']['error_message'] = 'Not a valid value, pick a value from the drop-down list.'
-            fields_with_dropdowns.append(field)
-        return fields_with_dropdowns
-
-    else:
-        for field in fields_dict.keys():
-            if field in fields_with_dropdown_list:
-                fields_dict[field]['valid']['validate'] = 'list'
-                fields_dict[field]['valid']['source'] = get_dropdown_list_from_csv(field)
-                fields_dict[field]['valid']['error_message'] = 'Not a valid value, pick a value from the drop-down list.'
-        return fields_dict
+    '''
+    Values of the drop-down list for a field, from the column named after the field.
+    Each CSV file is read once, and again only when it changes.
+
+    Returns
+    -------
+    dropdown_list: tuple
+        Values of the drop-down list. Empty values are left out.
+    '''
+    filepath = get_dropdown_list_filepath(field)
+    signature = files_signature([filepath])
+    cached = _dropdown_lists.get(filepath)
+    if cached is None or cached[0] != signature:
+        with _dropdown_lists_lock:
+            cached = _dropdown_lists.get(filepath)
+            if cached is None or cached[0] != signature:
+                with open(filepath, newline='', encoding='utf-8') as f:
+                    dropdown_list = tuple(row[field] for row in csv.DictReader(f) if row[field])
+                cached = (signature, dropdown_list)
+                _dropdown_lists[filepath] = cached
+    return cached[1]
+
+def dropdown_lists_signature():
+    '''
+    Signature of the drop-down list CSV files, changes when one of them changes
+    '''
+    return files_signature([get_dropdown_list_filepath(field) for field in FIELDS_WITH_DROPDOWN_LIST])
+
+def with_dropdown_list(field_id, field):
+    '''
+    Copy of a field with its validation set to the drop-down list of the field.
+    The field itself is not modified, as it can be shared through the field registry.
+    '''
+    valid = dict(field['valid'])
+    valid['validate'] = 'list'
+    valid['source'] = list(get_dropdown_list_from_csv(field_id))
+    valid['error_message'] = 'Not a valid value, pick a value from the drop-down list.'
+    return dict(field, valid=valid)
+
+def attach_dropdown_lists(fields):
+    '''
+    Attach the drop-down lists to a catalogue, looking up only the fields that have a drop-down list
+
+    Parameters
+    ----------
+    fields: list of dictionaries
+        Catalogue of fields, each with an 'id'
+
+    Returns
+    -------
+    fields: list of dictionaries
+        New list, in which the fields with a drop-down list are replaced by copies with the list attached
+    '''
+    fields = list(fields)
+    positions = {field['id']: idx for idx, field in enumerate(fields)}
+    for field_id in FIELDS_WITH_DROPDOWN_LIST:
+        if field_id in positions:
+            idx = positions[field_id]
+            fields[idx] = with_dropdown_list(field_id, fields[idx])
+    return fields
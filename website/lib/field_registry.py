@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide registry of the field catalogues used by the template generator:
+the fields designed for the template generator (other_fields.json),
+the CF standard names, the Darwin Core terms, the Darwin Core cores and extensions
+and the global attributes.
+
+The catalogues are parsed once and shared by all requests.
+Fields with a drop-down list get their list attached when the registry is built.
+The registry is rebuilt when one of the catalogue files or drop-down lists
+changes on disk, for example after pulling the latest terms from /update.
+The records in the registry are shared, so they must not be modified.
+Copy a record before changing it.
+"""
+
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+import pandas as pd
+from .cache_utils import signature_version
+from .catalogues import catalogue_signature, load_catalogues, read_dwc_extension
+from .dropdown_lists_from_static_config_files import attach_dropdown_lists, dropdown_lists_signature
+from .pull_darwin_core_terms import extensions
+from .search_index import SearchIndex, SEARCH_CATALOGUES
+
+# Budget for the Darwin Core cores and extensions kept loaded, by their number of terms, which is
+# counted the same whether they are read from the compiled catalogue or the JSON files.
+# Least recently used extensions are dropped when it is exceeded, and loaded again when needed.
+# The current cores and extensions have about 550 terms together, so they all fit, with room to grow.
+DWC_EXTENSION_CACHE_TERMS = 1000
+
+def set_dwc_extension_cache_budget(max_terms):
+    '''
+    Set the number of terms of loaded Darwin Core cores and extensions, for registries built from now on
+    '''
+    global DWC_EXTENSION_CACHE_TERMS
+    DWC_EXTENSION_CACHE_TERMS = max_terms
+
+def registry_signature(fields_filepath):
+    '''
+    Signature of the catalogue files and of the drop-down lists attached to them
+    '''
+    return catalogue_signature(fields_filepath) + dropdown_lists_signature()
+
+class DwcExtension(object):
+    """
+    Terms of a Darwin Core core or extension, indexed by id
+    """
+
+    def __init__(self, terms, description):
+        self.terms = tuple(attach_dropdown_lists(terms))
+        self.terms_by_id = MappingProxyType({term['id']: term for term in self.terms})
+        self.description = description
+        # Counted against the budget of the cache
+        self.size = len(self.terms)
+
+class FieldRegistry(object):
+    """
+    Immutable, id-indexed view of the field catalogues
+    """
+
+    def __init__(self, fields_filepath):
+        """
+        Loads the catalogues from the fields directory,
+        using the compiled catalogue when it is up to date
+        Parameters
+        ----------
+        fields_filepath: string
+            Directory holding the field catalogues
+        """
+        self.fields_filepath = fields_filepath
+        # Signature taken before reading so that a concurrent update makes the registry stale
+        self.signature = registry_signature(fields_filepath)
+        self.version = signature_version(self.signature)
+
+        catalogues = load_catalogues(fields_filepath, catalogue_signature(fields_filepath))
+
+        # Drop-down validations are attached once here, so requests never have to
+        self.other_fields = tuple(attach_dropdown_lists(catalogues['other_fields']))
+        self.cf_standard_names = tuple(attach_dropdown_lists(catalogues['cf_standard_names']))
+        self.dwc_terms = tuple(attach_dropdown_lists(catalogues['dwc_terms']))
+        self.global_attributes_columns = tuple(catalogues['global_attributes']['columns'])
+        self.global_attributes_rows = tuple(tuple(row) for row in catalogues['global_attributes']['rows'])
+
+        self.other_fields_by_id = MappingProxyType({field['id']: field for field in self.other_fields})
+        self.cf_standard_names_by_id = MappingProxyType({field['id']: field for field in self.cf_standard_names})
+        self.dwc_terms_by_id = MappingProxyType({term['id']: term for term in self.dwc_terms})
+
+        # Darwin Core cores and extensions are only loaded when first used,
+        # and kept in a least recently used cache within DWC_EXTENSION_CACHE_TERMS.
+        # Pickled by file in the compiled catalogue, None when reading the JSON files.
+        self._compiled_dwc_extensions = catalogues['dwc_extensions']
+        self._dwc_extensions = OrderedDict()
+        self._dwc_extensions_size = 0
+        self._dwc_extensions_budget = DWC_EXTENSION_CACHE_TERMS
+        self._dwc_extensions_lock = threading.Lock()
+
+        # Descriptions are small, so they are kept when an extension is dropped from the cache
+        self._dwc_extension_descriptions = dict(catalogues['dwc_extension_descriptions'] or {})
+
+        # Search indexes, built when first used
+        self._search_indexes = {}
+        self._search_indexes_lock = threading.Lock()
+
+    def get_dwc_extension(self, extension):
+        '''
+        Get the terms of a Darwin Core core or extension, loading them if they are not in the cache
+
+        Parameters
+        ----------
+        extension: string
+            Name of the core or extension, e.g. 'Event Core'
+
+        Returns
+        -------
+        dwc_extension: DwcExtension
+        '''
+        filename = extensions[extension]['file']
+        with self._dwc_extensions_lock:
+            dwc_extension = self._dwc_extensions.get(filename)
+            if dwc_extension is not None:
+                self._dwc_extensions.move_to_end(filename)
+                return dwc_extension
+
+            dwc_extension = self._load_dwc_extension(filename)
+            self._dwc_extension_descriptions[filename] = dwc_extension.description
+            self._dwc_extensions[filename] = dwc_extension
+            self._dwc_extensions_size += dwc_extension.size
+
+            # Drop least recently used extensions, always keeping the one just loaded
+            while self._dwc_extensions_size > self._dwc_extensions_budget and len(self._dwc_extensions) > 1:
+                _, dropped = self._dwc_extensions.popitem(last=False)
+                self._dwc_extensions_size -= dropped.size
+
+            return dwc_extension
+
+    def _load_dwc_extension(self, filename):
+        if self._compiled_dwc_extensions is not None:
+            content = pickle.loads(self._compiled_dwc_extensions[filename])
+        else:
+            content = read_dwc_extension(self.fields_filepath, filename)
+        return DwcExtension(content['terms'], content['description'])
+
+    def get_dwc_extension_description(self, extension):
+        '''
+        Description of a Darwin Core core or extension.
+        Only loads the extension if its description is not known yet.
+        '''
+        filename = extensions[extension]['file']
+        if filename not in self._dwc_extension_descriptions:
+            self.get_dwc_extension(extension)
+        return self._dwc_extension_descriptions[filename]
+
+    def get_search_index(self, catalogue):
+        '''
+        Search index of a catalogue, built on first use
+
+        Parameters
+        ----------
+        catalogue: string
+            'cf' for the CF standard names, 'dwc' for the Darwin Core terms, 'other' for other_fields.json
+
+        Returns
+        -------
+        search_index: SearchIndex
+        '''
+        if catalogue not in SEARCH_CATALOGUES:
+            raise ValueError(f"Unknown catalogue '{catalogue}', must be one of {list(SEARCH_CATALOGUES)}")
+        search_index = self._search_indexes.get(catalogue)
+        if search_index is None:
+            with self._search_indexes_lock:
+                search_index = self._search_indexes.get(catalogue)
+                if search_index is None:
+                    search_index = SearchIndex(getattr(self, SEARCH_CATALOGUES[catalogue]))
+                    self._search_indexes[catalogue] = search_index
+        return search_index
+
+    def get_global_attributes_df(self):
+        '''
+        Global attributes as a new dataframe, which the caller can modify
+        '''
+        return pd.DataFrame(list(self.global_attributes_rows), columns=list(self.global_attributes_columns))
+
+    def is_stale(self):
+        '''
+        True if a catalogue file has changed since the registry was built
+        '''
+        return registry_signature(self.fields_filepath) != self.signature
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+def get_field_registry(fields_filepath):
+    '''
+    Get the registry for a fields directory, building it if it is missing or stale
+
+    Parameters
+    ----------
+    fields_filepath: string
+        Directory holding the field catalogues
+
+    Returns
+    -------
+    registry: FieldRegistry
+    '''
+    key = os.path.normpath(os.path.abspath(fields_filepath))
+    registry = _registries.get(key)
+    if registry is None or registry.is_stale():
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None or registry.is_stale():
+                registry = FieldRegistry(key)
+                _registries[key] = registry
+    return registry
+
+def invalidate_field_registries():
+    '''
+    Drop all registries so that they are rebuilt on next use
+    '''
+    with _registries_lock:
+        _registries.clear()
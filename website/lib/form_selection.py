@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fields selected for a template, by sheet
+
+The form of the home page has one key per selected field, named '<sheet>__<field>'.
+The keys are parsed once, and each selected field is then looked up by id in the
+configuration snapshot, so that resolving a selection scales with the number of
+selected fields rather than with the size of the catalogues.
+"""
+
+class FormSelection(object):
+    '''
+    Fields selected in a form, by sheet, in the order of the form
+    '''
+
+    def __init__(self, form_keys):
+        '''
+        Parameters
+        ----------
+        form_keys: list of strings
+            Keys of the form, e.g. 'Data__time'. Keys without '__' are not fields and are left out.
+            Bounds (e.g. 'Data__depth_bounds') are left out if their coordinate is not selected.
+        '''
+        form_keys = [key for key in form_keys if '__' in key]
+        key_set = set(form_keys)
+
+        # All sheets with a key in the form, including bounds that are left out
+        self.sheets = set()
+        # Field ids by sheet. Dictionaries are used as ordered sets.
+        self.fields_by_sheet = {}
+
+        for key in form_keys:
+            sheet, field = key.split('__')[:2]
+            self.sheets.add(sheet)
+            if key.endswith('_bounds') and key[:-len('_bounds')] not in key_set:
+                continue
+            self.fields_by_sheet.setdefault(sheet, {})[field] = None
+
+    def __contains__(self, sheet):
+        return sheet in self.sheets
+
+    def get_fields(self, sheet):
+        '''
+        Ids of the fields selected in a sheet, in the order of the form
+        '''
+        return list(self.fields_by_sheet.get(sheet, {}).keys())
+
+def resolve_selection(selection, snapshot, output_config_dict, all_fields_dict, sheets):
+    '''
+    Look up the fields selected in each sheet
+
+    Parameters
+    ----------
+    selection: FormSelection
+    snapshot: ConfigSnapshot
+        Resolved configuration the fields are selected from
+    output_config_dict: dictionary
+        Output configuration dictionary of the request, from snapshot.get_output_config_dict
+    all_fields_dict: dictionary
+        Fields of the configuration and extra fields, by id
+    sheets: list of strings
+        Sheets to include in the template
+
+    Returns
+    -------
+    template_fields_dict: dictionary
+        Fields to write to each sheet of the template.
+        CF standard names come first and Darwin Core terms second, in the order of their catalogues,
+        followed by the other fields in the order of the form.
+    added_cf_names_dic: dictionary
+        CF standard names added to each sheet
+    added_dwc_terms_dic: dictionary
+        Darwin Core terms added to each sheet
+    added_fields_dic: dictionary
+        Extra fields added to each sheet
+    '''
+    template_fields_dict = {}
+    added_cf_names_dic = {}
+    added_dwc_terms_dic = {}
+    added_fields_dic = {}
+
+    for sheet in sheets:
+        template_fields_dict[sheet] = {}
+        added_cf_names_dic[sheet] = {}
+        added_dwc_terms_dic[sheet] = {}
+        added_fields_dic[sheet] = {}
+
+        field_ids = selection.get_fields(sheet)
+
+        # CF standard names
+        cf_ids = [
+            field_id for field_id in field_ids
+            if field_id in snapshot.cf_standard_name_positions and field_id not in output_config_dict[sheet]
+        ]
+        for field_id in sorted(cf_ids, key=snapshot.cf_standard_name_positions.__getitem__):
+            field = snapshot.cf_standard_names[snapshot.cf_standard_name_positions[field_id]]
+            description = field['description']
+            if description is None:
+                description = ""
+            template_fields_dict[sheet][field_id] = {
+                'disp_name': field_id,
+                'valid': field['valid'],
+                'description': f"{description} \ncanonical units: {field['canonical_units']}",
+                'format': "double precision"
+            }
+            added_cf_names_dic[sheet][field_id] = template_fields_dict[sheet][field_id]
+
+        # DwC terms
+        dwc_term_ids = snapshot.dwc_term_ids_by_sheet[sheet]
+        dwc_ids = [
+            field_id for field_id in field_ids
+            if field_id in dwc_term_ids and field_id not in output_config_dict[sheet]
+        ]
+        for field_id in sorted(dwc_ids, key=snapshot.dwc_term_positions.__getitem__):
+            term = snapshot.dwc_terms[snapshot.dwc_term_positions[field_id]]
+            description = term['description']
+            if description is None:
+                description = ""
+            template_fields_dict[sheet][field_id] = {
+                'disp_name': field_id,
+                'description': description,
+                'format': "double precision",
+                'valid': term['valid']
+            }
+            added_dwc_terms_dic[sheet][field_id] = template_fields_dict[sheet][field_id]
+
+        # Other fields (not CF standard names or DwC terms - terms designed for the template generator and logging system)
+        for field_id in field_ids:
+            if field_id not in added_cf_names_dic[sheet] and field_id not in added_dwc_terms_dic[sheet]:
+                template_fields_dict[sheet][field_id] = all_fields_dict[field_id] # fields to write to template
+                if field_id in snapshot.extra_fields_dict:
+                    added_fields_dic[sheet][field_id] = snapshot.extra_fields_dict[field_id] # Extra fields added to template generator interface by user
+
+    return template_fields_dict, added_cf_names_dic, added_dwc_terms_dic, added_fields_dic
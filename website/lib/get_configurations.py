@@ -1,41 +1,19 @@
-import yaml
-from .pull_cf_standard_names import cf_standard_names_to_dic
-from .pull_other_fields import other_fields_to_dic
-from .pull_darwin_core_terms import dwc_terms_to_dic, dwc_extension_to_dic
-from website import CONFIG_PATH
+from .field_registry import get_field_registry
+from .config_model import get_config_model, FROM_SOURCE
 import copy
+import threading
 
 def get_list_of_configs():
 
-    configs = yaml.safe_load(open(CONFIG_PATH, encoding='utf-8'))['setups']
-    configs_list = []
-
-    for config in configs:
-        configs_list.append(config)
-
-    return configs_list
+    return list(get_config_model().configs)
 
 def get_list_of_subconfigs(config):
 
-    configs = yaml.safe_load(open(CONFIG_PATH, encoding='utf-8'))['setups']
-    subconfigs = []
-
-    if config in ['Nansen Legacy logging system', 'Darwin Core']:
-        for subconfig in configs[config]:
-            subconfigs.append(subconfig)
-
-    return subconfigs
+    return list(get_config_model().subconfigs.get(config, ()))
 
 def get_config_fields_dic(config, subconfig=None):
 
-    configs = yaml.safe_load(open(CONFIG_PATH, encoding='utf-8'))['setups']
-
-    if subconfig:
-        config_dict = configs[config][subconfig]
-    else:
-        config_dict = configs[config]
-
-    return config_dict
+    return get_config_model().get_config_dict(config, subconfig)
 
 def get_config_fields(fields_filepath, config, subconfig=None):
 
@@ -55,21 +33,23 @@ def get_config_fields(fields_filepath, config, subconfig=None):
     extra_fields_dict = {}
     groups = []
 
-    other_fields = other_fields_to_dic(fields_filepath)
-    cf_standard_names = cf_standard_names_to_dic(fields_filepath)
-    dwc_terms = dwc_terms_to_dic(fields_filepath)
-
-    all_fields = other_fields + cf_standard_names + dwc_terms
+    registry = get_field_registry(fields_filepath)
+    other_fields = registry.other_fields
+    cf_standard_names = registry.cf_standard_names
+    dwc_terms = list(registry.dwc_terms)
 
     cf_standard_names = [cf_standard_name for cf_standard_name in cf_standard_names if cf_standard_name['id'] not in fields_in_config_list]
 
-    for field in all_fields:
-        if field['id'] in fields_in_config_list:
-            fields_in_config_dict[field['id']] = field
+    # Records in the registry are shared between requests, so the fields
+    # that are modified further down the line are copied
+    for field_id in fields_in_config_list:
+        for index in [registry.other_fields_by_id, registry.cf_standard_names_by_id, registry.dwc_terms_by_id]:
+            if field_id in index:
+                fields_in_config_dict[field_id] = copy.deepcopy(index[field_id])
 
     for field in other_fields:
         if field['id'] not in fields_in_config_list:
-            extra_fields_dict[field['id']] = field
+            extra_fields_dict[field['id']] = copy.deepcopy(field)
             groups.append(field['grouping'])
     groups = sorted(list(set(groups)))
 
@@ -78,8 +58,7 @@ def get_config_fields(fields_filepath, config, subconfig=None):
     else:
         dwc_subconfig = 'Sampling Event'
 
-    dwc_terms_copy = copy.deepcopy(dwc_terms)
-    dwc_conf_dict = get_dwc_config_dict(fields_filepath = fields_filepath, subconfig = dwc_subconfig, dwc_terms = dwc_terms_copy)
+    dwc_conf_dict = get_dwc_config_dict(fields_filepath = fields_filepath, subconfig = dwc_subconfig)
 
     # Creating a dictionary for the configuration that I can use
     if config == 'Darwin Core':
@@ -108,9 +87,10 @@ def get_config_fields(fields_filepath, config, subconfig=None):
 
     return output_config_dict, fields_in_config_list, extra_fields_dict, cf_standard_names, groups, dwc_terms
 
-def get_dwc_config_dict(fields_filepath, subconfig, dwc_terms):
+def get_dwc_config_dict(fields_filepath, subconfig):
 
-    config_dict = yaml.safe_load(open(CONFIG_PATH, encoding='utf-8'))['setups']['Darwin Core'][subconfig]
+    config_dict = get_config_model().get_config_dict('Darwin Core', subconfig)
+    registry = get_field_registry(fields_filepath)
 
     output_config_dict = {}
     for extension in config_dict.keys():
@@ -121,7 +101,7 @@ def get_dwc_config_dict(fields_filepath, subconfig, dwc_terms):
         output_config_dict[extension]['Required CSV'] = config_dict[extension]['Required CSV']
         output_config_dict[extension]['Source'] = source
 
-        dwc_extension = dwc_extension_to_dic(fields_filepath, extension)
+        dwc_extension = registry.get_dwc_extension(extension)
 
         for key, value in criteria.items():
             output_config_dict[extension][key] = {}
@@ -130,21 +110,19 @@ def get_dwc_config_dict(fields_filepath, subconfig, dwc_terms):
                     # validation from extension, as extension has information about the type (integer, decimal..)
                     # description from main as it contains more information more reliably.
                     # Sometimes the term is not in the extension or vice versa. This is possible when 'eventID' needs to be in an extension, for example.
-                    try:
-                        output_config_dict[extension][key][term] = get_dwc_term_dict_from_main(term,dwc_terms)
-                    except:
-                        output_config_dict[extension][key][term] = get_dwc_term_dict_from_extension(term,dwc_extension)
-                    if output_config_dict[extension][key][term]['description'] == '':
-                        output_config_dict[extension][key][term]['description'] = get_dwc_term_description_from_extension(term,dwc_extension)
-                    try:
-                        output_config_dict[extension][key][term]['valid'] = get_validation_from_extension(term, dwc_extension)
-                    except:
-                        pass
+                    term_dict = get_dwc_term_dict_from_main(term, registry.dwc_terms_by_id)
+                    if term_dict is None:
+                        term_dict = get_dwc_term_dict_from_extension(term, dwc_extension.terms_by_id)
+                    # Terms are shared through the registry, so copied before modifying
+                    term_dict = dict(term_dict)
+                    if term_dict['description'] == '':
+                        term_dict['description'] = get_dwc_term_description_from_extension(term, dwc_extension.terms_by_id)
+                    validation = get_validation_from_extension(term, dwc_extension.terms_by_id)
+                    if validation is not None:
+                        term_dict['valid'] = validation
+                    output_config_dict[extension][key][term] = term_dict
             else:
-                try:
-                    output_config_dict[extension][key] = get_dwc_terms_from_extension(dwc_extension)
-                except:
-                    pass
+                output_config_dict[extension][key] = get_dwc_terms_from_extension(dwc_extension.terms)
 
         # Removing fields from recommended that are already in required
         for field in output_config_dict[extension]['Required'].keys():
@@ -166,66 +144,102 @@ def get_dwc_config_dict(fields_filepath, subconfig, dwc_terms):
 
     return output_config_dict
 
-def get_dwc_term_dict_from_main(term,dwc_terms):
-
-    terms_dict = [dic for dic in dwc_terms if dic['id'] == term][0]
-
-    return terms_dict
-
-def get_dwc_term_dict_from_extension(term,dwc_extension):
-
-    terms_dict = [dic for dic in dwc_extension if dic['id'] == term][0]
-
-    return terms_dict
-
-def get_dwc_term_description_from_extension(term,dwc_extension):
+def get_dwc_term_dict_from_main(term, dwc_terms_by_id):
+    '''
+    Term from the main Darwin Core catalogue, or None if it is not there
+    '''
+    return dwc_terms_by_id.get(term)
 
-    terms_dict = [dic for dic in dwc_extension if dic['id'] == term][0]
-    description = terms_dict['description']
+def get_dwc_term_dict_from_extension(term, extension_terms_by_id):
 
-    return description
+    return extension_terms_by_id[term]
 
-def get_validation_from_extension(term,dwc_extension):
+def get_dwc_term_description_from_extension(term, extension_terms_by_id):
 
-    terms_dict = [dic for dic in dwc_extension if dic['id'] == term]
-    validation = terms_dict[0]['valid']
+    return extension_terms_by_id[term]['description']
 
-    return validation
+def get_validation_from_extension(term, extension_terms_by_id):
+    '''
+    Validation of the term in the extension, or None if the term is not in the extension
+    '''
+    if term in extension_terms_by_id:
+        return extension_terms_by_id[term]['valid']
+    return None
 
 def get_dwc_terms_from_extension(dwc_extension):
 
     terms_dict = {}
 
+    # Terms are shared through the registry, so copied as they may be modified
     for term in dwc_extension:
-        terms_dict[term['id']] = term
+        terms_dict[term['id']] = dict(term)
 
     return terms_dict
 
+# Field requirements by (fields_filepath, config, subconfig, sheetname),
+# for the versions of the field registry and configuration model in _field_requirements_versions
+_field_requirements = {}
+_field_requirements_versions = None
+_field_requirements_lock = threading.Lock()
+
 def get_field_requirements(fields_filepath, config, subconfig, sheetname):
     '''
     Get field requirements for template generator
     Dictates how column headers are formatted (colour coded)
+    Cached per sheet until the field catalogues or configurations change.
+
+    Returns
+    -------
+    required_fields: frozenset
+    recommended_fields: frozenset
+    dwc_terms: frozenset
+        Darwin Core terms that are not required or recommended
+    cf_standard_names: frozenset
+        CF standard names, not including those that are required or recommended
     '''
-    config_dict = get_config_fields_dic(config=config, subconfig=subconfig)
+    global _field_requirements_versions
 
-    cf_standard_names = cf_standard_names_to_dic(fields_filepath)
-    cf_standard_names = [cf_standard_name['id'] for cf_standard_name in cf_standard_names]
+    registry = get_field_registry(fields_filepath)
+    config_model = get_config_model()
+    versions = (registry.version, config_model.version)
+    key = (fields_filepath, config, subconfig, sheetname)
 
-    dwc_terms_dic = dwc_terms_to_dic(fields_filepath)
-    dwc_terms = [term['term_localName'] for term in dwc_terms_dic]
+    with _field_requirements_lock:
+        if versions != _field_requirements_versions:
+            _field_requirements.clear()
+            _field_requirements_versions = versions
+        if key not in _field_requirements:
+            _field_requirements[key] = build_field_requirements(registry, config_model, config, subconfig, sheetname)
+        return _field_requirements[key]
+
+def build_field_requirements(registry, config_model, config, subconfig, sheetname):
+
+    cf_standard_names = frozenset(registry.cf_standard_names_by_id.keys())
+    dwc_terms = frozenset(registry.dwc_terms_by_id.keys())
 
     if config == 'Nansen Legacy logging system':
-        required_fields = config_dict['fields'][0]['Required']
-        recommended_fields = config_dict['fields'][0]['Recommended']
-        dwc_terms = [term for term in dwc_terms if term not in required_fields and term not in recommended_fields]
-        cf_standard_names = [term for term in cf_standard_names if term not in required_fields and term not in recommended_fields]
+        requirements = config_model.get_sheet_requirements(config, subconfig, sheetname)
+        required_fields = requirements.required
+        recommended_fields = requirements.recommended
+        dwc_terms = dwc_terms - required_fields - recommended_fields
+        cf_standard_names = cf_standard_names - required_fields - recommended_fields
     elif config == 'Darwin Core':
-        required_fields = config_dict[sheetname]['fields'][0]['Required']
-        recommended_fields = config_dict[sheetname]['fields'][0]['Recommended']
-        dwc_terms = [term for term in dwc_terms if term not in required_fields and term not in recommended_fields]
-    elif config == 'CF-NetCDF':
-        required_fields = []
-        recommended_fields = []
+        requirements = config_model.get_sheet_requirements(config, subconfig, sheetname)
+        required_fields = requirements.required
+        recommended_fields = requirements.recommended
+        if requirements.from_source:
+            # A requirement given as 'from source' has always been compared as a string, so a term
+            # counts if it is part of the string (e.g. 'source'), rather than all the terms of the source
+            extension_terms = frozenset(registry.get_dwc_extension(sheetname).terms_by_id.keys())
+            from_source_terms = frozenset(term for term in dwc_terms | extension_terms if term in FROM_SOURCE)
+            if 'Required' in requirements.from_source:
+                required_fields = from_source_terms
+            if 'Recommended' in requirements.from_source:
+                recommended_fields = from_source_terms
+        dwc_terms = dwc_terms - required_fields - recommended_fields
+    else:
+        required_fields = frozenset()
+        recommended_fields = frozenset()
 
     return (
     required_fields,
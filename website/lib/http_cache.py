@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP caching of the configuration pages
+
+The page of a configuration only depends on the configuration, the subconfiguration,
+the versions of the field registry and template_configurations.yaml, the HTML
+templates, and the fingerprints of the static files that its URLs carry. Its ETag is built from those, so that a browser reloading the page gets
+a 304 without the catalogues being touched.
+
+The rendered pages are also kept in a bounded in-process cache under the same key,
+so that other browsers get the page without the configuration being rendered again.
+"""
+
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from website import BASE_PATH
+from .cache_utils import files_signature, signature_version
+from .compression import etag_variants, static_signature
+
+TEMPLATES_PATH = os.path.join(BASE_PATH, 'website', 'templates')
+PAGE_TEMPLATE_FILES = ['base.html', 'home.html']
+STATIC_PATH = os.path.join(BASE_PATH, 'website', 'static')
+
+# Browsers keep the page, but check with the ETag before using it
+PAGE_CACHE_CONTROL = 'private, no-cache'
+
+# Fingerprints of the static files, taken once rather than on every request.
+# Static files change with a deploy, which restarts the server, or are refreshed from /update.
+_static_signature = None
+_static_signature_lock = threading.Lock()
+
+def get_static_signature():
+    '''
+    Fingerprints of the static files, taken with the first page
+    '''
+    global _static_signature
+    if _static_signature is None:
+        refresh_static_signature()
+    return _static_signature
+
+def refresh_static_signature():
+    '''
+    Take the fingerprints of the static files again
+    '''
+    global _static_signature
+    with _static_signature_lock:
+        _static_signature = static_signature(STATIC_PATH)
+
+def page_etag(config, subconfig, registry_version, config_version):
+    '''
+    Strong ETag of the page of a configuration
+
+    Parameters
+    ----------
+    config: string
+        'Darwin Core', 'CF-NetCDF', or 'Nansen Legacy logging system'
+    subconfig: string
+        Subconfiguration, or None if the configuration has none
+    registry_version: string
+        Version of the field registry
+    config_version: string
+        Version of the configuration model
+
+    Returns
+    -------
+    etag: string
+    '''
+    templates_signature = files_signature([os.path.join(TEMPLATES_PATH, filename) for filename in PAGE_TEMPLATE_FILES])
+    return signature_version((config, subconfig, registry_version, config_version, templates_signature, get_static_signature()))
+
+def matching_etag(if_none_match, etag):
+    '''
+    The ETag of the page, or of one of its compressed representations, that the client already has.
+    None if the client does not have the page.
+    '''
+    for variant in etag_variants(etag):
+        if if_none_match.contains(variant):
+            return variant
+    return None
+
+def has_pending_flashes(session):
+    '''
+    True if messages are waiting to be flashed, in which case the page is not the same as the cached one
+    '''
+    return bool(session.get('_flashes'))
+
+def with_page_etag(response, etag):
+    '''
+    Set the ETag and Cache-Control headers of a page response
+    '''
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = PAGE_CACHE_CONTROL
+    return response
+
+class PageCache(object):
+    '''
+    Least recently used cache of rendered pages, by ETag
+
+    Parameters
+    ----------
+    max_entries: int
+        Number of pages kept
+    compress: boolean
+        If True, pages are kept gzip compressed, which takes about a tenth of the memory
+    '''
+
+    def __init__(self, max_entries=32, compress=True):
+        self.max_entries = max_entries
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag, gzipped=False):
+        '''
+        Rendered page for an ETag, or None if it is not in the cache
+
+        Parameters
+        ----------
+        etag: string
+        gzipped: boolean
+            If True and pages are kept compressed, return the gzip compressed page as it is kept
+        '''
+        with self._lock:
+            page = self._pages.get(etag)
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(etag)
+            self.hits += 1
+        if self.compress and not gzipped:
+            return gzip.decompress(page).decode('utf-8')
+        return page
+
+    def set(self, etag, html):
+        if self.max_entries <= 0:
+            return
+        if self.compress:
+            page = gzip.compress(html.encode('utf-8'), compresslevel=6)
+        else:
+            page = html
+        with self._lock:
+            self._pages[etag] = page
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        '''
+        Counters of the cache, e.g. for monitoring
+        '''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._pages),
+                'max_entries': self.max_entries,
+                'compressed': self.compress,
+                'bytes': sum(len(page) for page in self._pages.values())
+            }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streaming the records of the catalogue JSON files
+
+The catalogue files are a list of records, or an object holding a list of records
+under one key (e.g. 'terms' in the Darwin Core extensions). The records are decoded
+one at a time from a buffer read in chunks, so only the attributes that are kept
+from each record stay in memory rather than the whole decoded file.
+"""
+
+import json
+import sys
+
+CHUNK_SIZE = 64 * 1024
+
+def _interned_object(pairs):
+    # json.loads shares the keys within a document, records decoded one at a time do not
+    return {sys.intern(key): value for key, value in pairs}
+
+_decoder = json.JSONDecoder(object_pairs_hook=_interned_object)
+_WHITESPACE = ' \t\n\r'
+# Characters that can continue a number
+_NUMBER_CHARS = '0123456789+-.eE'
+
+class _JsonStream(object):
+    '''
+    Buffer over a text file from which JSON values are decoded one at a time
+    '''
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has already been decoded before growing the buffer
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        '''
+        Next character that is not whitespace, without consuming it. Empty string at the end of the file.
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at position {self.pos}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def decode(self):
+        '''
+        Decode the next JSON value, reading more of the file until it is complete
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk, e.g. '0.' of '0.5'
+            if (
+                isinstance(value, (int, float)) and not isinstance(value, bool)
+                and (end == len(self.buffer) or self.buffer[end] in _NUMBER_CHARS)
+                and not self.eof and self._read()
+            ):
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        '''
+        Decode the elements of the array starting at the current position, one at a time
+        '''
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.expect(',]') == ']':
+                return
+
+def iter_records(f, key=None, attributes=None, on_value=None, chunk_size=CHUNK_SIZE):
+    '''
+    Iterate over the records of a JSON file without decoding the whole file at once
+
+    Parameters
+    ----------
+    f: file object
+        JSON file opened in text mode
+    key: string
+        Key of the list of records if the file holds an object, None if the file holds a list
+    attributes: list of strings
+        Attributes kept from each record, all attributes if None.
+        Attributes missing from a record are left out.
+    on_value: function
+        Called with (key, value) for the other members of the object, when key is given
+
+    Returns
+    -------
+    records: generator of dictionaries
+    '''
+    stream = _JsonStream(f, chunk_size)
+
+    if key is None:
+        records = stream.iter_array()
+    else:
+        records = _iter_member(stream, key, on_value)
+
+    for record in records:
+        if attributes is not None:
+            record = {attribute: record[attribute] for attribute in attributes if attribute in record}
+        yield record
+
+def _iter_member(stream, key, on_value):
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        member = stream.decode()
+        stream.expect(':')
+        if member == key:
+            yield from stream.iter_array()
+        else:
+            value = stream.decode()
+            if on_value is not None:
+                on_value(member, value)
+        if stream.expect(',}') == '}':
+            return
@@ -15,6 +15,10 @@ config_dir = os.path.abspath(os.path.join(
 
 sys.path.append(config_dir)
 from .check_internet import have_internet
+from .json_stream import iter_records
+
+# Attributes of the standard names used by the app and the templates
+CF_STANDARD_NAME_ATTRIBUTES = ['id', 'disp_name', 'description', 'valid', 'format', 'cell_format', 'canonical_units']
 
 class CF_standard_names_json():
     '''
@@ -81,7 +85,19 @@ class CF_standard_names_json():
         with open(self.filename, 'w', encoding='utf-8') as f:
            json.dump(self.dic2, f, ensure_ascii=False, indent=4)
 
-    def load_json(self):
+    def load_json(self, projected=False):
+        '''
+        Load the standard names from the JSON file
+
+        Parameters
+        ----------
+        projected: boolean
+            If True, stream the file and only keep the CF_STANDARD_NAME_ATTRIBUTES of each standard name
+        '''
+        if projected:
+            with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
+                self.dic = list(iter_records(f, attributes=CF_STANDARD_NAME_ATTRIBUTES))
+            return
         with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
            content = f.read()
            cleaned_content = content.encode('utf-8').decode('utf-8', 'ignore')
@@ -105,7 +121,7 @@ def cf_standard_names_update(path):
         return errors
     return errors
 
-def cf_standard_names_to_dic(path):
+def cf_standard_names_to_dic(path, projected=False):
     cf_standard_names_json = CF_standard_names_json(path)
-    cf_standard_names_json.load_json()
+    cf_standard_names_json.load_json(projected)
     return cf_standard_names_json.dic
@@ -16,6 +16,11 @@ from .check_internet import have_internet
 import threading
 import requests
 import xml.etree.ElementTree as ET
+from .json_stream import iter_records
+
+# Attributes of the terms used by the app and the templates.
+# The JSON files also keep the other columns of the TDWG CSV and GBIF XML.
+TERM_ATTRIBUTES = ['id', 'disp_name', 'description', 'valid', 'format', 'cell_format']
 
 class Darwin_Core_Terms_json():
     '''
@@ -136,7 +141,19 @@ class Darwin_Core_Terms_json():
             json.dump(self.dic2, f, ensure_ascii=False, indent=4)
 
 
-    def load_json(self):
+    def load_json(self, projected=False):
+        '''
+        Load the terms from the JSON file
+
+        Parameters
+        ----------
+        projected: boolean
+            If True, stream the file and only keep the TERM_ATTRIBUTES of each term
+        '''
+        if projected:
+            with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
+                self.dic = list(iter_records(f, attributes=TERM_ATTRIBUTES))
+            return
         with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
             cleaned_content = content.encode('utf-8').decode('utf-8', 'ignore')
@@ -291,11 +308,27 @@ class Darwin_Core_Extension():
             json.dump(self.dic2, f, ensure_ascii=False, indent=4)
 
 
-    def load_json(self):
+    def load_json(self, projected=False):
+        '''
+        Load the terms and description from the JSON file
+
+        Parameters
+        ----------
+        projected: boolean
+            If True, stream the file and only keep the TERM_ATTRIBUTES of each term
+        '''
+        if projected:
+            other_members = {}
+            with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
+                self.dic = list(iter_records(f, key='terms', attributes=TERM_ATTRIBUTES, on_value=other_members.__setitem__))
+            self.description = other_members.get('description')
+            return
         with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read()
             cleaned_content = content.encode('utf-8').decode('utf-8', 'ignore')
-            self.dic = json.loads(cleaned_content)['terms']
+            content = json.loads(cleaned_content)
+            self.dic = content['terms']
+            self.description = content.get('description')
 
     def get_description(self):
         with open(self.filename, 'r', encoding='utf-8', errors='ignore') as f:
@@ -382,9 +415,9 @@ def dwc_terms_update(path):
 
     return errors
 
-def dwc_terms_to_dic(path):
+def dwc_terms_to_dic(path, projected=False):
     dwc_terms_json = Darwin_Core_Terms_json(path)
-    dwc_terms_json.load_json()
+    dwc_terms_json.load_json(projected)
     return dwc_terms_json.dic
 
 def dwc_extensions_update(path):
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Search of the field catalogues
+
+An inverted index from the words of the ids and descriptions of a catalogue to
+the fields they appear in. It is built once per catalogue version, by the field
+registry, and answers multi-word queries without scanning the catalogue.
+
+Ids are split into words on underscores and camelCase, e.g. 'sea_water_temperature'
+and 'minimumDepthInMeters'. Each word of a query must be the start of a word of
+the id or the description of a field. Fields matching in the id rank higher than
+fields matching in the description, and whole words rank higher than prefixes.
+
+This replaces the substring search of the term lists in the browser: a query for
+the middle of a word, e.g. 'perature', no longer matches. Words with non-ASCII
+letters, e.g. 'Tromsø', are kept whole, as camelCase is only split in ASCII words.
+
+    >>> registry = get_field_registry(FIELDS_PATH)
+    >>> registry.get_search_index('cf').search('sea water temp', limit=10)
+"""
+
+import re
+from bisect import bisect_left
+
+# Catalogues of the field registry that can be searched
+SEARCH_CATALOGUES = {
+    'cf': 'cf_standard_names',
+    'dwc': 'dwc_terms',
+    'other': 'other_fields'
+}
+
+# Weight of a query word, by where it matches
+EXACT_ID_WEIGHT = 4
+PREFIX_ID_WEIGHT = 3
+EXACT_DESCRIPTION_WEIGHT = 2
+PREFIX_DESCRIPTION_WEIGHT = 1
+# Added when the query is the id of the field
+ID_MATCH_BONUS = 10
+
+_runs_re = re.compile(r'[^\W_]+')
+_words_re = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+def tokenize(text):
+    '''
+    Lower case words of a text or id, splitting on punctuation, underscores and camelCase
+    '''
+    if not text:
+        return []
+    words = []
+    for run in _runs_re.findall(str(text)):
+        if run.isascii():
+            words.extend(_words_re.findall(run))
+        else:
+            words.append(run)
+    return [word.lower() for word in words]
+
+class SearchIndex(object):
+    """
+    Inverted index over the ids and descriptions of a catalogue
+    """
+
+    def __init__(self, fields):
+        '''
+        Parameters
+        ----------
+        fields: tuple of dictionaries
+            Catalogue of fields, each with an 'id' and a 'description'
+        '''
+        self.fields = fields
+        id_postings = {}
+        description_postings = {}
+
+        for position, field in enumerate(fields):
+            field_id = str(field['id'])
+            # The whole id is a word too, so that a query can be the start of an id
+            for word in set(tokenize(field_id) + [field_id.lower()]):
+                id_postings.setdefault(word, set()).add(position)
+            for word in set(tokenize(field.get('description'))):
+                if len(word) > 1:
+                    description_postings.setdefault(word, set()).add(position)
+
+        self._id_postings = {word: frozenset(positions) for word, positions in id_postings.items()}
+        self._description_postings = {word: frozenset(positions) for word, positions in description_postings.items()}
+        # Sorted words, to find the words starting with a prefix
+        self._id_words = sorted(self._id_postings)
+        self._description_words = sorted(self._description_postings)
+        self._positions_by_id = {str(field['id']).lower(): position for position, field in enumerate(fields)}
+
+    @staticmethod
+    def _words_with_prefix(words, prefix):
+        idx = bisect_left(words, prefix)
+        while idx < len(words) and words[idx].startswith(prefix):
+            yield words[idx]
+            idx += 1
+
+    def _match(self, query_word):
+        '''
+        Weight of the best match of a query word, by position of the field
+        '''
+        weights = {}
+        for words, postings, exact_weight, prefix_weight in [
+            (self._description_words, self._description_postings, EXACT_DESCRIPTION_WEIGHT, PREFIX_DESCRIPTION_WEIGHT),
+            (self._id_words, self._id_postings, EXACT_ID_WEIGHT, PREFIX_ID_WEIGHT)
+        ]:
+            for word in self._words_with_prefix(words, query_word):
+                weight = exact_weight if word == query_word else prefix_weight
+                for position in postings[word]:
+                    if weights.get(position, 0) < weight:
+                        weights[position] = weight
+        return weights
+
+    def search_positions(self, q):
+        '''
+        Positions in the catalogue of the fields matching every word of the query, best first
+
+        Parameters
+        ----------
+        q: string
+            Search words
+
+        Returns
+        -------
+        positions: list of int
+            Ranked by score, then in the order of the catalogue.
+            All positions in the order of the catalogue if the query has no words.
+        '''
+        query_words = sorted(set(tokenize(q)))
+        if not query_words:
+            return list(range(len(self.fields)))
+
+        matches = [self._match(word) for word in query_words]
+        # Start from the word matching the fewest fields
+        matches.sort(key=len)
+        scores = dict(matches[0])
+        for weights in matches[1:]:
+            scores = {position: score + weights[position] for position, score in scores.items() if position in weights}
+            if not scores:
+                return []
+
+        exact = self._positions_by_id.get(q.strip().lower())
+        if exact in scores:
+            scores[exact] += ID_MATCH_BONUS
+
+        return sorted(scores, key=lambda position: (-scores[position], position))
+
+    def search(self, q, limit=None):
+        '''
+        Fields matching every word of the query, best first
+
+        Parameters
+        ----------
+        q: string
+            Search words
+        limit: int
+            Maximum number of fields returned, all if None
+
+        Returns
+        -------
+        fields: list of dictionaries
+        '''
+        positions = self.search_positions(q)
+        if limit is not None:
+            positions = positions[:limit]
+        return [self.fields[position] for position in positions]
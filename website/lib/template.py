@@ -1,6 +1,6 @@
 from flask import render_template
 
-def print_html_template(output_config_dict, extra_fields_dict, groups, added_fields_dic, cf_standard_names, cf_groups, added_cf_names_dic, dwc_terms_by_sheet, added_dwc_terms_dic, list_of_configs, config, sheets_descriptions, list_of_subconfigs=None, subconfig=None, compulsary_sheets=None):
+def print_html_template(output_config_dict, extra_fields_dict, groups, added_fields_dic, cf_standard_names, cf_groups, added_cf_names_dic, dwc_terms_by_sheet, added_dwc_terms_dic, list_of_configs, config, sheets_descriptions, list_of_subconfigs=None, subconfig=None, compulsary_sheets=None, term_list_keys=None):
     '''
     Prints the html template. Excluding closing the <main> element which must be closed at the bottom of this script
     '''
@@ -52,5 +52,6 @@ def print_html_template(output_config_dict, extra_fields_dict, groups, added_fie
         config=config,
         subconfig=subconfig,
         description=description,
-        compulsary_sheets=compulsary_sheets
+        compulsary_sheets=compulsary_sheets,
+        term_list_keys=term_list_keys
     )
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Templates described by a compact JSON specification, for scripts
+
+    {
+        "config": "Nansen Legacy logging system",
+        "subconfig": "Activities",
+        "sheets": {
+            "Data": ["eventDate", "decimalLatitude", "sea_water_temperature"]
+        },
+        "split_personnel_columns": false,
+        "end_row": 2000,
+        "filename": "activities.xlsx"
+    }
+
+Each sheet lists the ids of its fields. The required fields of a sheet are always
+included, and the sheets that the configuration requires are always written, even if
+they are not listed. The filename is optional, and end_row is the final row that cell
+restrictions extend to (20000 by default), e.g. sized to the expected number of samples.
+Fields are resolved against the cached configuration snapshot, in the same way as the
+fields selected in the form of the home page.
+"""
+
+import os
+from .get_configurations import get_list_of_configs, get_list_of_subconfigs
+from .config_snapshot import get_config_snapshot
+from .form_selection import FormSelection, resolve_selection
+from .create_template import DEFAULT_END_ROW
+
+# Last row of a worksheet
+MAX_END_ROW = 1048575
+
+DEFAULT_FILENAME = 'Nansen_Legacy_template.xlsx'
+
+class TemplateSpecError(ValueError):
+    '''
+    The specification of a template is not valid
+    '''
+    pass
+
+def parse_template_spec(spec):
+    '''
+    Check the structure of a template specification
+
+    Parameters
+    ----------
+    spec: dictionary
+        Template specification, as decoded from JSON
+
+    Returns
+    -------
+    spec: dictionary
+        The specification with its defaults filled in
+    '''
+    if not isinstance(spec, dict):
+        raise TemplateSpecError('The template specification must be a JSON object')
+
+    config = spec.get('config')
+    if config not in get_list_of_configs():
+        raise TemplateSpecError(f"Unknown configuration '{config}', must be one of {get_list_of_configs()}")
+
+    subconfig = spec.get('subconfig') or None
+    list_of_subconfigs = get_list_of_subconfigs(config=config)
+    if list_of_subconfigs:
+        if subconfig not in list_of_subconfigs:
+            raise TemplateSpecError(f"Unknown subconfiguration '{subconfig}', must be one of {list_of_subconfigs}")
+    else:
+        subconfig = None
+
+    sheets = spec.get('sheets', {})
+    if not isinstance(sheets, dict):
+        raise TemplateSpecError("'sheets' must be an object with a list of field ids for each sheet")
+    for sheet, field_ids in sheets.items():
+        if not isinstance(field_ids, list) or not all(isinstance(field_id, str) for field_id in field_ids):
+            raise TemplateSpecError(f"The fields of sheet '{sheet}' must be a list of field ids")
+
+    split_personnel_columns = spec.get('split_personnel_columns', False)
+    if not isinstance(split_personnel_columns, bool):
+        raise TemplateSpecError("'split_personnel_columns' must be true or false")
+
+    end_row = spec.get('end_row', DEFAULT_END_ROW)
+    if not isinstance(end_row, int) or isinstance(end_row, bool) or not 0 < end_row <= MAX_END_ROW:
+        raise TemplateSpecError(f"'end_row' must be an integer between 1 and {MAX_END_ROW}")
+
+    filename = spec.get('filename') or DEFAULT_FILENAME
+    if not isinstance(filename, str) or os.path.basename(filename) != filename:
+        raise TemplateSpecError("'filename' must be a file name, without directories")
+    if not filename.endswith('.xlsx'):
+        filename += '.xlsx'
+
+    return {
+        'config': config,
+        'subconfig': subconfig,
+        'sheets': sheets,
+        'split_personnel_columns': split_personnel_columns,
+        'end_row': end_row,
+        'filename': filename
+    }
+
+def resolve_template_spec(spec, fields_filepath):
+    '''
+    Resolve the fields of a template specification
+
+    Parameters
+    ----------
+    spec: dictionary
+        Template specification, as returned by parse_template_spec
+    fields_filepath: string
+        Directory holding the field catalogues
+
+    Returns
+    -------
+    template_args: dictionary
+        Keyword arguments of create_template, apart from the output file
+    '''
+    config = spec['config']
+    subconfig = spec['subconfig']
+
+    snapshot = get_config_snapshot(fields_filepath, config, subconfig)
+    output_config_dict = snapshot.get_output_config_dict()
+
+    unknown_sheets = [sheet for sheet in spec['sheets'] if sheet not in output_config_dict]
+    if unknown_sheets:
+        raise TemplateSpecError(f"Unknown sheets {unknown_sheets}, must be among {list(output_config_dict.keys())}")
+
+    # Same fields as the form of the home page: fields of the configuration and extra fields
+    all_fields_dict = dict(snapshot.extra_fields_dict)
+    for sheet in output_config_dict.keys():
+        for key in output_config_dict[sheet].keys():
+            if key not in ['Required CSV', 'Source']:
+                for field, values in output_config_dict[sheet][key].items():
+                    all_fields_dict[field] = values
+
+    sheets = [
+        sheet for sheet in output_config_dict.keys()
+        if output_config_dict[sheet]['Required CSV'] == True or sheet in spec['sheets']
+    ]
+
+    # The form keys the home page would post, required fields first
+    form_keys = []
+    for sheet in sheets:
+        for field_id in output_config_dict[sheet].get('Required', {}):
+            form_keys.append(f'{sheet}__{field_id}')
+        for field_id in spec['sheets'].get(sheet, []):
+            if (
+                field_id not in all_fields_dict
+                and field_id not in snapshot.cf_standard_name_positions
+                and field_id not in snapshot.dwc_term_ids_by_sheet[sheet]
+            ):
+                raise TemplateSpecError(f"Unknown field '{field_id}' in sheet '{sheet}'")
+            form_keys.append(f'{sheet}__{field_id}')
+
+    template_fields_dict = resolve_selection(FormSelection(form_keys), snapshot, output_config_dict, all_fields_dict, sheets)[0]
+
+    sheets_info = {}
+    for sheet in sheets:
+        sheets_info[sheet] = {
+            'description': snapshot.sheets_descriptions[sheet],
+            'source': output_config_dict[sheet].get('Source')
+        }
+
+    return {
+        'template_fields_dict': template_fields_dict,
+        'sheets_info': sheets_info,
+        'fields_filepath': fields_filepath,
+        'config': config,
+        'subconfig': subconfig,
+        'conversions': True,
+        'metadata': config != 'Darwin Core',
+        'split_personnel_columns': spec['split_personnel_columns'],
+        'end_row': spec['end_row']
+    }
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Contents of the term pickers of the home page, served in pages
+
+The CF standard names and Darwin Core terms that can be added to a sheet are
+no longer rendered into the page. The modals fetch them from /api/terms when
+they are opened, one page at a time. Searches go through the search index of
+the field registry.
+
+Pages are cached by the key of the term list they are taken from rather than by
+sheet, as most sheets pick from the same terms.
+"""
+
+import threading
+from collections import OrderedDict
+from math import ceil
+from .field_registry import get_field_registry
+
+# Catalogues of the term pickers: CF standard names, Darwin Core terms and other_fields.json
+TERM_PICKER_CATALOGUES = ['cf', 'dwc', 'other']
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Number of pages of terms kept
+TERM_PAGE_CACHE_ENTRIES = 256
+
+_term_pages = OrderedDict()
+_term_pages_lock = threading.Lock()
+
+def get_picker_terms(snapshot, catalogue, sheet):
+    '''
+    Terms that can be picked for a sheet
+
+    Parameters
+    ----------
+    snapshot: ConfigSnapshot
+    catalogue: string
+        'cf' for CF standard names, 'dwc' for Darwin Core terms, 'other' for the extra fields
+    sheet: string
+        Sheet the terms are added to
+
+    Returns
+    -------
+    terms: tuple of dictionaries
+    '''
+    if catalogue not in TERM_PICKER_CATALOGUES:
+        raise ValueError(f"Unknown catalogue '{catalogue}', must be one of {TERM_PICKER_CATALOGUES}")
+    if sheet not in snapshot.output_config_dict:
+        raise ValueError(f"Unknown sheet '{sheet}'")
+    if catalogue == 'cf':
+        return snapshot.cf_standard_names
+    if catalogue == 'dwc':
+        return snapshot.dwc_terms_by_sheet[sheet]
+    return tuple(snapshot.extra_fields_dict.values())
+
+def search_terms(snapshot, catalogue, terms, q):
+    '''
+    Terms matching the query, best first, or all terms in their order if the query is empty
+    '''
+    if not q.strip():
+        return terms
+    available = set(term['id'] for term in terms)
+    search_index = get_field_registry(snapshot.fields_filepath).get_search_index(catalogue)
+    return [term for term in search_index.search(q) if term['id'] in available]
+
+def get_term_page(snapshot, catalogue, sheet, q='', page=1, page_size=DEFAULT_PAGE_SIZE):
+    '''
+    Page of the terms that can be picked for a sheet
+
+    Parameters
+    ----------
+    snapshot: ConfigSnapshot
+    catalogue: string
+        'cf' for CF standard names, 'dwc' for Darwin Core terms, 'other' for the extra fields
+    sheet: string
+        Sheet the terms are added to
+    q: string
+        Search words, each of which must start a word of the id or description of a term
+    page: int
+        Page number, starting at 1
+    page_size: int
+        Number of terms per page, at most MAX_PAGE_SIZE
+
+    Returns
+    -------
+    term_page: dictionary
+        The terms of the page, with their id and description, and the total number of terms and pages
+    '''
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    page = max(1, page)
+    q = ' '.join(q.split())
+
+    picker_terms = get_picker_terms(snapshot, catalogue, sheet)
+
+    key = (snapshot.term_list_keys[catalogue][sheet], catalogue, q, page, page_size)
+    with _term_pages_lock:
+        term_page = _term_pages.get(key)
+        if term_page is not None:
+            _term_pages.move_to_end(key)
+    if term_page is None:
+        term_page = _build_term_page(snapshot, catalogue, picker_terms, q, page, page_size)
+        with _term_pages_lock:
+            _term_pages[key] = term_page
+            while len(_term_pages) > TERM_PAGE_CACHE_ENTRIES:
+                _term_pages.popitem(last=False)
+
+    return dict(term_page, sheet=sheet)
+
+def _build_term_page(snapshot, catalogue, picker_terms, q, page, page_size):
+    terms = search_terms(snapshot, catalogue, picker_terms, q)
+    start = (page - 1) * page_size
+
+    return {
+        'catalogue': catalogue,
+        'q': q,
+        'page': page,
+        'page_size': page_size,
+        'total': len(terms),
+        'pages': max(1, ceil(len(terms) / page_size)),
+        'terms': [
+            {'id': term['id'], 'description': term['description'] or ''}
+            for term in terms[start:start + page_size]
+        ]
+    }
@@ -1,8 +1,12 @@
 from ipwhois import IPWhois
 import json
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+# Visits are logged one at a time in the background, as looking up the country is a network request
+_visit_logger = ThreadPoolExecutor(max_workers=1)
+
 # Function to get country from IP using ipstack API (example)
 def get_country_from_ip(ip):
     # Check if the IP address is the loopback address (localhost)
@@ -32,6 +36,15 @@ def log_visit(ip, DB_PATH):
     conn.commit()
     conn.close()
 
+# Function to log site visit without holding up the response
+def log_visit_in_background(ip, DB_PATH):
+    def log():
+        try:
+            log_visit(ip, DB_PATH)
+        except Exception as e:
+            print(f"Error logging visit: {ip} - {e}")
+    _visit_logger.submit(log)
+
 def log_template(ip, config, subconfig, sheets, DB_PATH):
     conn = sqlite3.connect(DB_PATH)
     c = conn.cursor()
@@ -43,4 +56,20 @@ def log_template(ip, config, subconfig, sheets, DB_PATH):
     c.execute("INSERT INTO templates (timestamp, ip, country, config, subconfig, sheets) VALUES (?, ?, ?, ?, ?, ?)", (timestamp, ip, country, config, subconfig, sheets_json))
 
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+
+# Function to log a batch of templates, looking up the country once
+def log_templates(ip, templates, DB_PATH):
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+
+    country = get_country_from_ip(ip)
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [
+        (timestamp, ip, country, config, subconfig, json.dumps(list(sheets)))
+        for config, subconfig, sheets in templates
+    ]
+    c.executemany("INSERT INTO templates (timestamp, ip, country, config, subconfig, sheets) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    conn.commit()
+    conn.close()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of generated workbooks
+
+A workbook only depends on the configuration, the subconfiguration, the ids of
+the fields of each sheet in order, the options of create_template, and the
+versions of the field registry, template_configurations.yaml, create_template.py,
+the readmes and the CF_Attributes submodule.
+Those are hashed into a key, and the workbook is kept under that key in memory and
+on disk, both bounded in size and evicting the least recently used workbooks first.
+
+The key is also the ETag of the workbook. Workbooks built from previous catalogues
+are never served, as their keys have other versions, and the cache is cleared when
+the catalogues are updated.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import stat
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from .cache_utils import files_signature, signature_version
+from .config_model import get_config_model
+from .field_registry import get_field_registry
+from . import create_template as create_template_module
+from .create_template import DEFAULT_END_ROW, CF_Attributes
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_EXTENSION = '.xlsx'
+
+# Directory of the CF_Attributes submodule, which create_template imports from
+CF_ATTRIBUTES_PATH = os.path.dirname(os.path.abspath(sys.modules[CF_Attributes.__module__].__file__))
+
+def template_source_files(fields_filepath):
+    '''
+    Files that workbooks are built from, apart from the catalogues and the configurations
+
+    Parameters
+    ----------
+    fields_filepath: string
+        Directory holding the field catalogues, next to which the readmes are
+
+    Returns
+    -------
+    filepaths: list of strings
+    '''
+    filepaths = [create_template_module.__file__]
+    filepaths += sorted(glob.glob(os.path.join(os.path.dirname(fields_filepath), 'readmes', '*.txt')))
+    for dirpath, dirnames, filenames in os.walk(CF_ATTRIBUTES_PATH):
+        dirnames[:] = sorted(dirname for dirname in dirnames if not dirname.startswith('.') and dirname != '__pycache__')
+        filepaths += [os.path.join(dirpath, filename) for filename in sorted(filenames) if not filename.startswith('.')]
+    return filepaths
+
+def workbook_key(template_args):
+    '''
+    Hash of everything a workbook is built from
+
+    Parameters
+    ----------
+    template_args: dictionary
+        Keyword arguments of create_template, apart from the output file
+
+    Returns
+    -------
+    key: string
+        None if the workbook cannot be cached
+    '''
+    # Global attributes given as a dataframe and prefilled data are not part of the key, those workbooks are not cached
+    if template_args.get('global_attributes_df') is not None:
+        return None
+    for fields in template_args['template_fields_dict'].values():
+        if any('data' in vals for vals in fields.values()):
+            return None
+    canonical = {
+        'config': template_args['config'],
+        'subconfig': template_args.get('subconfig'),
+        'sheets': [
+            [sheet, list(fields.keys())]
+            for sheet, fields in template_args['template_fields_dict'].items()
+        ],
+        'conversions': template_args.get('conversions', True),
+        'metadata': template_args.get('metadata', True),
+        'split_personnel_columns': template_args.get('split_personnel_columns', False),
+        'streaming': template_args.get('streaming', False),
+        'end_row': template_args.get('end_row', DEFAULT_END_ROW),
+        'versions': [
+            get_field_registry(template_args['fields_filepath']).version,
+            get_config_model().version,
+            signature_version(files_signature(template_source_files(template_args['fields_filepath'])))
+        ]
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode('utf-8')).hexdigest()
+
+class WorkbookCache(object):
+    '''
+    Least recently used cache of workbooks by key, in memory and on disk
+
+    Parameters
+    ----------
+    max_bytes: int
+        Size of the workbooks kept in memory
+    directory: string
+        Directory of the workbooks kept on disk, None to keep them in memory only.
+        It must be owned by the user running the server and closed to other users,
+        otherwise workbooks are kept in memory only.
+    max_disk_bytes: int
+        Size of the workbooks kept on disk
+    '''
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, directory=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._workbooks = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        if self.directory is not None and not self._check_directory():
+            self.directory = None
+
+    def _check_directory(self):
+        '''
+        Create the directory if needed, and check that no other user can plant or read workbooks in it
+        '''
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            # Not followed if it is a link, which someone else may have created
+            directory_stat = os.lstat(self.directory)
+        except OSError as e:
+            logger.warning(f"Workbooks kept in memory only, could not create {self.directory}: {e}")
+            return False
+        if not stat.S_ISDIR(directory_stat.st_mode):
+            logger.warning(f"Workbooks kept in memory only, {self.directory} is not a directory")
+            return False
+        if directory_stat.st_uid != os.getuid():
+            logger.warning(f"Workbooks kept in memory only, {self.directory} is owned by another user")
+            return False
+        if directory_stat.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+            logger.warning(f"Workbooks kept in memory only, {self.directory} is open to other users (mode {stat.filemode(directory_stat.st_mode)})")
+            return False
+        return True
+
+    def _filepath(self, key):
+        return os.path.join(self.directory, key + WORKBOOK_EXTENSION)
+
+    def get(self, key):
+        '''
+        Workbook for a key, or None if it is not in the cache
+        '''
+        if key is None:
+            return None
+        with self._lock:
+            workbook = self._workbooks.get(key)
+            if workbook is not None:
+                self._workbooks.move_to_end(key)
+                self.hits += 1
+                return workbook
+
+        workbook = self._read_disk(key)
+        with self._lock:
+            if workbook is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._set_memory(key, workbook)
+        return workbook
+
+    def set(self, key, workbook):
+        if key is None:
+            return
+        self._set_memory(key, workbook)
+        self._write_disk(key, workbook)
+
+    def _set_memory(self, key, workbook):
+        if len(workbook) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._workbooks.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._workbooks[key] = workbook
+            self._bytes += len(workbook)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._workbooks.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _read_disk(self, key):
+        if self.directory is None:
+            return None
+        filepath = self._filepath(key)
+        try:
+            with open(filepath, 'rb') as f:
+                workbook = f.read()
+            # The modification time orders the workbooks on disk by last use
+            os.utime(filepath)
+        except OSError:
+            return None
+        return workbook
+
+    def _write_disk(self, key, workbook):
+        if self.directory is None or len(workbook) > self.max_disk_bytes:
+            return
+        tmp_filepath = None
+        try:
+            # Written under another name and renamed, so that a workbook is never read half written
+            fd, tmp_filepath = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(workbook)
+            os.replace(tmp_filepath, self._filepath(key))
+        except OSError as e:
+            logger.warning(f"Could not write workbook to the cache: {e}")
+            if tmp_filepath is not None and os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            return
+        self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(WORKBOOK_EXTENSION):
+                try:
+                    stat = os.stat(os.path.join(self.directory, filename))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, filename))
+        return entries
+
+    def _evict_disk(self):
+        with self._disk_lock:
+            entries = sorted(self._disk_entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, filename in entries:
+                if total <= self.max_disk_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            self._workbooks.clear()
+            self._bytes = 0
+        if self.directory is not None:
+            with self._disk_lock:
+                for _, _, filename in self._disk_entries():
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        '''
+        Counters of the cache, e.g. for monitoring
+        '''
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._workbooks),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+        if self.directory is not None:
+            entries = self._disk_entries()
+            stats.update({
+                'directory': self.directory,
+                'disk_entries': len(entries),
+                'disk_bytes': sum(size for _, size, _ in entries),
+                'max_disk_bytes': self.max_disk_bytes
+            })
+        return stats